@@ -0,0 +1,126 @@
+"""Build every solver table ahead of time, in parallel
+
+    python build_tables.py [--workers N] [--verify]
+
+Run once on a new machine so the first solve doesn't pay for the tables
+(about 10 seconds of work on one core, all tables together). The work runs on a
+multiprocessing pool in three steps:
+
+1. Move tables whose rows are built one by one in Python are split into
+   chunks of rows. Workers write their chunks straight into a memory-mapped
+   partial file, and a progress file lists the finished chunks, so an
+   interrupted build picks up where it stopped.
+2. Tables that only need the facelet move tables: the 2x2 distance table,
+   the remaining 3x3 move tables and the 4x4 tables, one table per worker.
+3. The 3x3 pruning tables, which need the 3x3 move tables. Each one is a
+   breadth-first search: every depth's frontier is split into index ranges
+   that the workers expand into a memory-mapped partial file, and the
+   progress file records each finished depth.
+
+Step 2 resumes per table: every finished table is saved with its checksum
+(see cube_tables) and skipped on the next run. Before building, every
+existing table is checked against its checksum and a damaged one is
+deleted, so it gets built again.
+"""
+import importlib
+import multiprocessing
+import os
+import time
+
+import solver_2x2
+import solver_3x3
+import solver_4x4
+from cube_core import TABLE_DIR, get_move_table
+from cube_tables import CHECKSUM_SUFFIX, build_layers, build_rows, is_table_valid
+
+ROW_TABLES = [solver_2x2.PERM_MOVES, solver_2x2.TWIST_MOVES, solver_3x3.TWIST_MOVES, solver_3x3.FLIP_MOVES]
+
+# (module, function, arguments) per table job, run after the row tables
+TABLE_JOBS = [
+    ('solver_2x2', 'get_distance_table', ()),
+    ('solver_3x3', 'get_move_tables', ()),
+    ('build_tables', 'build_center_stage', (0,)),
+    ('build_tables', 'build_center_stage', (1,)),
+    ('build_tables', 'build_center_stage', (2,)),
+    ('solver_4x4', 'get_cycle_table', ()),
+]
+
+def build_center_stage(index):
+    """Build one 4x4 center stage table (stages hold lambdas, so jobs pass an index)"""
+    solver_4x4.get_stage_table(solver_4x4.CENTER_STAGES[index])
+
+def run_job(job):
+    """Build one table in a worker"""
+    module, function, args = job
+    start = time.perf_counter()
+    getattr(importlib.import_module(module), function)(*args)
+    return f"{module}.{function}{args if args else ''}", time.perf_counter() - start
+
+def remove_damaged():
+    """Delete every table that doesn't match its checksum, return their names"""
+    damaged = []
+    for name in sorted(os.listdir(TABLE_DIR)) if os.path.isdir(TABLE_DIR) else []:
+        if not name.endswith(CHECKSUM_SUFFIX) or name.endswith('.partial' + CHECKSUM_SUFFIX):
+            continue
+        table = name[:-len(CHECKSUM_SUFFIX)]
+        path = os.path.join(TABLE_DIR, table)
+        if os.path.exists(path) and not is_table_valid(table, os.path.getsize(path)):
+            os.remove(path)
+            os.remove(path + CHECKSUM_SUFFIX)
+            damaged.append(table)
+    return damaged
+
+def build_all(workers=None):
+    """Build every missing or damaged table on a pool of worker processes"""
+    for table in remove_damaged():
+        print(f"{table}: damaged, rebuilding")
+
+    # The facelet move tables are tiny and every other table needs them, so they come first and from one process
+    for size in (2, 3, 4):
+        get_move_table(size)
+
+    with multiprocessing.Pool(workers) as pool:
+        for spec in ROW_TABLES:
+            start = time.perf_counter()
+            if build_rows(spec, pool):
+                print(f"{spec['name']}: {time.perf_counter() - start:.2f}s")
+
+        for name, seconds in pool.imap_unordered(run_job, TABLE_JOBS):
+            print(f"{name}: {seconds:.2f}s")
+
+        for spec in solver_3x3.PRUNING_TABLES:
+            start = time.perf_counter()
+            if build_layers(spec, pool):
+                print(f"{spec['name']}: {time.perf_counter() - start:.2f}s")
+
+def verify_all():
+    """Check every table that has a checksum, return the number of bad ones"""
+    bad = 0
+    for name in sorted(os.listdir(TABLE_DIR)):
+        if not name.endswith(CHECKSUM_SUFFIX):
+            continue
+        table = name[:-len(CHECKSUM_SUFFIX)]
+        path = os.path.join(TABLE_DIR, table)
+        ok = os.path.exists(path) and is_table_valid(table, os.path.getsize(path))
+        bad += not ok
+        with open(os.path.join(TABLE_DIR, name)) as f:
+            print(f"{'ok ' if ok else 'BAD'} {f.read().strip()} {table}")
+    return bad
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the solver tables")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--verify', action='store_true', help="check the checksums of the built tables and exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(1 if verify_all() else 0)
+
+    start = time.perf_counter()
+    build_all(args.workers)
+    print(f"Tables ready in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
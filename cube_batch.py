@@ -0,0 +1,91 @@
+"""Vectorized batch simulator that moves thousands of cubes at once with NumPy
+
+Every row of CubeBatch.states is one cube in the same facelet layout as
+cube_core.FaceletCube, and moves use the very same permutations from
+cube_core's move tables, so batch results match the interactive game.
+"""
+import numpy as np
+
+from cube_core import FaceletCube, get_max_depth, get_move_names, get_move_table, sequence_permutation
+
+
+class CubeBatch:
+    def __init__(self, size, count):
+        self.size = size
+        area = size * size
+
+        # One row per cube, all solved to start with
+        solved = np.repeat(np.arange(6, dtype=np.uint8), area)
+        self.states = np.tile(solved, (count, 1))
+
+        # All move permutations stacked so per-row moves are a single fancy index
+        self.table = get_move_table(size)
+        self.move_names = get_move_names(size)
+        self.move_index = {name: i for i, name in enumerate(self.move_names)}
+        self.perms = np.array([self.table['perms'][name] for name in self.move_names], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.states)
+
+    @classmethod
+    def from_cubes(cls, cubes):
+        """Build a batch from FaceletCube objects of the same size"""
+        batch = cls(cubes[0].size, len(cubes))
+        batch.states = np.array([np.frombuffer(cube.facelets, dtype=np.uint8) for cube in cubes])
+        return batch
+
+    def to_cube(self, row):
+        """Get one row of the batch as a FaceletCube"""
+        cube = FaceletCube(self.size)
+        cube.load_facelets(self.states[row].tobytes())
+        return cube
+
+    def apply_move(self, move):
+        """Apply the same move to every cube in one gather"""
+        self.states = self.states[:, self.perms[self.move_index[move]]]
+
+    def apply_sequence(self, moves):
+        """Apply the same move sequence to every cube, collapsed into one gather"""
+        if moves:
+            perm = np.frombuffer(sequence_permutation(moves, self.table), dtype=np.uint16)
+            self.states = self.states[:, perm]
+
+    def apply_moves(self, move_ids):
+        """Apply a different move to each cube, given as indices into move_names"""
+        gather = self.perms[np.asarray(move_ids)]
+        self.states = np.take_along_axis(self.states, gather, axis=1)
+
+    def apply_sequences(self, move_ids):
+        """Apply one sequence per cube, given as a (cubes, length) array of move indices"""
+        move_ids = np.asarray(move_ids)
+        for step in range(move_ids.shape[1]):
+            self.apply_moves(move_ids[:, step])
+
+    def random_sequences(self, length, rng=None):
+        """Draw scramble move indices for every cube, never turning the same layer twice in a row"""
+        if rng is None:
+            rng = np.random.default_rng()
+
+        # Same layers as cube_core.generate_scramble: outer layers, plus inner slices above 3x3
+        max_depth = get_max_depth(self.size)
+        layers = np.array([face * max_depth + depth
+                           for face in range(6) for depth in range(self.size // 2)])
+
+        # Adding 1..len-1 to the previous choice can never land on the same layer again
+        choice = np.empty((len(self), length), dtype=np.intp)
+        choice[:, 0] = rng.integers(len(layers), size=len(self))
+        for step in range(1, length):
+            choice[:, step] = (choice[:, step - 1] + rng.integers(1, len(layers), size=len(self))) % len(layers)
+
+        return layers[choice] * 3 + rng.integers(3, size=(len(self), length))
+
+    def scramble(self, length, rng=None):
+        """Scramble every cube with its own random sequence and return the move indices used"""
+        move_ids = self.random_sequences(length, rng)
+        self.apply_sequences(move_ids)
+        return move_ids
+
+    def is_solved(self):
+        """Check every cube at once, a cube is solved when each face shows a single color"""
+        faces = self.states.reshape(len(self), 6, self.size * self.size)
+        return (faces == faces[:, :, :1]).all(axis=(1, 2))
@@ -0,0 +1,147 @@
+"""Solution cache keyed by cube state up to symmetry
+
+A cube state and its images under the 48 symmetries of the cube (24
+rotations, each with or without a mirror) are solved by the same moves
+relabelled, so they share one cache entry. The key is the smallest
+canonical facelet string (see cube_encoding) over all 48 images. Entries
+store the solution of that representative image and are mapped back
+through the symmetry on a hit.
+
+The cache keeps the most recently used entries in memory, so solutions
+survive between runs. Each new entry is appended to the cache file in
+tables/, and the file is only rewritten, with just the kept entries, once
+it holds twice as many lines as the cache.
+"""
+import itertools
+import os
+from collections import OrderedDict
+
+from cube_core import FaceletCube, get_layout, get_move_table
+from cube_encoding import canonical_facelets
+from cube_tables import get_table_path, save_table
+
+CACHE_FILE = 'solutions.txt'
+CACHE_SIZE = 4096               # entries kept in memory and on disk
+COMPACT_LINES = 2 * CACHE_SIZE  # cache file lines that make the next store rewrite the file
+
+cache = None       # OrderedDict (size, key) -> representative solution, least recently used first
+file_lines = 0     # lines in the cache file, replaced and dropped entries included
+symmetries = {}    # cube size -> list of (facelet gather, move renaming)
+
+def build_symmetries(size):
+    """Build every symmetry as a facelet gather and the move renaming that goes with it"""
+    layout = get_layout(size)
+    table = get_move_table(size)
+    moves_by_perm = {tuple(perm): move for move, perm in table['perms'].items()}
+
+    result = []
+    # Signed permutations of the x, y, z axes: 24 rotations and their 24 mirror images
+    for axes in itertools.permutations(range(3)):
+        for signs in itertools.product((1, -1), repeat=3):
+            def transform(vec):
+                return tuple(signs[k] * vec[axes[k]] for k in range(3))
+
+            # Facelet i moves to slot target[i], so the image gathers from the inverse
+            gather = [0] * len(layout['facelets'])
+            for index, (pos, normal) in enumerate(layout['facelets']):
+                gather[layout['index'][(transform(pos), transform(normal))]] = index
+
+            # A move on the original is the conjugated move on the image
+            inverse = [0] * len(gather)
+            for index, source in enumerate(gather):
+                inverse[source] = index
+            renaming = {}
+            for move, perm in table['perms'].items():
+                renaming[move] = moves_by_perm[tuple(inverse[perm[source]] for source in gather)]
+            result.append((gather, renaming))
+    return result
+
+def get_symmetries(size):
+    """Get the symmetries for a cube size, building them on first use"""
+    if size not in symmetries:
+        symmetries[size] = build_symmetries(size)
+    return symmetries[size]
+
+def reduce_state(cube):
+    """Get the symmetry-reduced key of a cube and the symmetry that maps it onto the key"""
+    facelets = cube.facelets
+    image = FaceletCube(cube.size)
+    best = None
+    for symmetry in get_symmetries(cube.size):
+        image.load_facelets(facelets[source] for source in symmetry[0])
+        key = canonical_facelets(image)
+        if best is None or key < best[0]:
+            best = (key, symmetry)
+    return best
+
+def format_entry(size, key, moves):
+    """Get the cache file line of one entry"""
+    return ' '.join([str(size), key.hex()] + moves) + '\n'
+
+def load_cache():
+    """Load the cache file into memory (one 'size key moves...' line per entry, later lines win)"""
+    global cache, file_lines
+    cache = OrderedDict()
+    file_lines = 0
+    path = get_table_path(CACHE_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            # A line cut off by a crash during an append is dropped
+            if not line.endswith('\n'):
+                break
+            file_lines += 1
+            fields = line.split()
+            if len(fields) >= 2:
+                key = (int(fields[0]), bytes.fromhex(fields[1]))
+                cache[key] = fields[2:]
+                cache.move_to_end(key)
+    while len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+def save_cache():
+    """Rewrite the cache file with the kept entries, oldest first so the order survives a reload"""
+    global file_lines
+    save_table(CACHE_FILE, ''.join(format_entry(size, key, moves) for (size, key), moves in cache.items()).encode())
+    file_lines = len(cache)
+
+def append_entry(size, key, moves):
+    """Add one entry to the end of the cache file"""
+    global file_lines
+    path = get_table_path(CACHE_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(format_entry(size, key, moves))
+    file_lines += 1
+
+def lookup(cube):
+    """Get a cached solution (list of moves) for the cube, or None"""
+    if cache is None:
+        load_cache()
+    key, (gather, renaming) = reduce_state(cube)
+    moves = cache.get((cube.size, key))
+    if moves is None:
+        return None
+    cache.move_to_end((cube.size, key))
+
+    # Stored moves solve the image, undo the renaming to solve the cube itself
+    original = {image_move: move for move, image_move in renaming.items()}
+    return [original[move] for move in moves]
+
+def store(cube, solution):
+    """Remember a solution for the cube and every symmetric state"""
+    if cache is None:
+        load_cache()
+    key, (gather, renaming) = reduce_state(cube)
+    moves = [renaming[move] for move in solution]
+    cache[(cube.size, key)] = moves
+    cache.move_to_end((cube.size, key))
+    while len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+    # Appending keeps each store to one short write, the rare rewrite drops the stale lines
+    if file_lines >= COMPACT_LINES:
+        save_cache()
+    else:
+        append_entry(cube.size, key, moves)
@@ -0,0 +1,466 @@
+"""Cube model, move engine, scrambles and solved detection with no OpenGL dependency
+
+The GLUT front end in main.py builds on this module. Headless jobs such as
+scramble generation or solver evaluation can import it on machines that
+have neither a display nor PyOpenGL.
+"""
+import os
+import random
+from array import array
+
+# Precomputed move tables are cached here between runs
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+
+# Face normal vectors
+FACE_NORMALS = {
+    (0, 0, 1): 'W',   # +Z (Up)
+    (0, 0, -1): 'Y',  # -Z (Down)
+    (0, 1, 0): 'B',   # +Y (Front)
+    (0, -1, 0): 'G',  # -Y (Back)
+    (1, 0, 0): 'R',   # +X (Right)
+    (-1, 0, 0): 'O'   # -X (Left)
+}
+
+# Rotation axis (outward normal) of each face
+FACE_AXES = {
+    'U': (0, 0, 1),   'D': (0, 0, -1),
+    'R': (1, 0, 0),   'L': (-1, 0, 0),
+    'F': (0, 1, 0),   'B': (0, -1, 0)
+}
+
+# Face order used by the facelet array: the facelets of face i occupy
+# indices i*size*size .. (i+1)*size*size - 1 and are colored i when solved
+FACES = ['U', 'D', 'R', 'L', 'F', 'B']
+FACE_COLOR_ORDER = ['W', 'Y', 'R', 'O', 'B', 'G']  # color index -> color letter
+
+class FaceletCube:
+    def __init__(self, size):
+        self.size = size
+        area = size * size
+
+        # One small integer per facelet, solved state shows each face's own color
+        self.facelets = bytearray(index // area for index in range(6 * area))
+
+        # Running color counts per face so the solved check never rescans the cube.
+        # A face is finished when a single color covers all of it.
+        self.face_counts = [[area if color == face else 0 for color in range(6)] for face in range(6)]
+        self.finished_faces = 6
+
+        # Running Zobrist hash: XOR of one random key per (facelet, color)
+        self.zobrist = get_zobrist_keys(size)
+        self.hash = self.full_hash()
+
+    def apply_permutation(self, perm, moved=None):
+        """Apply a move as a gather over the facelets it touches: new[i] = old[perm[i]]"""
+        facelets = self.facelets
+        if moved is None:
+            moved = [i for i, source in enumerate(perm) if source != i]
+
+        values = [facelets[perm[i]] for i in moved]
+        area = self.size * self.size
+
+        for i, value in zip(moved, values):
+            old = facelets[i]
+            if old == value:
+                continue
+
+            # Only the faces whose stickers changed need their counts updated
+            counts = self.face_counts[i // area]
+            if counts[old] == area:
+                self.finished_faces -= 1
+            counts[old] -= 1
+            counts[value] += 1
+            if counts[value] == area:
+                self.finished_faces += 1
+
+            # Swap the old sticker's key out of the hash and the new one in
+            self.hash ^= self.zobrist[i * 6 + old] ^ self.zobrist[i * 6 + value]
+            facelets[i] = value
+
+    def load_facelets(self, facelets):
+        """Replace the whole state with the given facelet colors"""
+        area = self.size * self.size
+        self.facelets = bytearray(facelets)
+        self.face_counts = [[self.facelets.count(color, face * area, (face + 1) * area) for color in range(6)]
+                            for face in range(6)]
+        self.finished_faces = sum(area in counts for counts in self.face_counts)
+        self.hash = self.full_hash()
+
+    def full_hash(self):
+        """Compute the Zobrist hash from scratch (moves keep self.hash up to date incrementally)"""
+        zobrist = self.zobrist
+        value = 0
+        for i, color in enumerate(self.facelets):
+            value ^= zobrist[i * 6 + color]
+        return value
+
+    def apply_move(self, move):
+        """Apply a single move given in notation (U, U', U2, ...)"""
+        table = get_move_table(self.size)
+        self.apply_permutation(table['perms'][move], table['moved'][move])
+
+    def apply_sequence(self, moves):
+        """Apply a whole move sequence as one collapsed permutation"""
+        if moves:
+            self.apply_permutation(sequence_permutation(moves, get_move_table(self.size)))
+
+    def is_solved(self):
+        """Check if every face shows a single color"""
+        return self.finished_faces == 6
+
+    def color_at(self, index):
+        """Get the color letter shown by a facelet"""
+        return FACE_COLOR_ORDER[self.facelets[index]]
+
+zobrist_tables = {}  # cube size -> 64-bit key per (facelet, color)
+
+def get_zobrist_keys(size):
+    """Get the Zobrist keys for a cube size, seeded by the size so hashes match between runs"""
+    if size not in zobrist_tables:
+        rng = random.Random(size)
+        zobrist_tables[size] = [rng.getrandbits(64) for _ in range(6 * size * size * 6)]
+    return zobrist_tables[size]
+
+def rotate_vector(vec, axis, clockwise=True):
+    """Rotate a vector 90 degrees around axis"""
+    x, y, z = vec
+    ax, ay, az = axis
+
+    if axis == (0, 0, 1):  # Z-axis rotation
+        if clockwise:
+            return (-y, x, z)
+        else:
+            return (y, -x, z)
+    elif axis == (0, 0, -1):  # -Z-axis rotation
+        if clockwise:
+            return (y, -x, z)
+        else:
+            return (-y, x, z)
+    elif axis == (1, 0, 0):  # X-axis rotation
+        if clockwise:
+            return (x, -z, y)
+        else:
+            return (x, z, -y)
+    elif axis == (-1, 0, 0):  # -X-axis rotation
+        if clockwise:
+            return (x, z, -y)
+        else:
+            return (x, -z, y)
+    elif axis == (0, 1, 0):  # Y-axis rotation
+        if clockwise:
+            return (z, y, -x)
+        else:
+            return (-z, y, x)
+    elif axis == (0, -1, 0):  # -Y-axis rotation
+        if clockwise:
+            return (-z, y, x)
+        else:
+            return (z, y, -x)
+
+    return vec
+
+def rotate_position(pos, axis, clockwise=True):
+    """Rotate position around axis by 90 degrees"""
+    return rotate_vector(pos, axis, clockwise)
+
+def get_face_axis(face):
+    """Get rotation axis for face"""
+    return FACE_AXES.get(face, (0, 0, 1))
+
+#Facelet layout
+layouts = {}  # cube size -> facelet layout
+
+def get_cube_positions(size):
+    """Get the cubelet coordinates along one axis, centered on zero (-1, 0, 1 for 3x3)"""
+    half_range = (size - 1) / 2
+    return [i - half_range for i in range(size)]
+
+def get_max_depth(size):
+    """Get the deepest layer a face move can turn (the middle slice on odd cubes)"""
+    return (size + 1) // 2
+
+def get_layout(size):
+    """Get the facelet layout for a cube size, building it on first use"""
+    if size not in layouts:
+        layouts[size] = build_facelet_layout(get_cube_positions(size))
+    return layouts[size]
+
+def build_facelet_layout(positions):
+    """Work out the position and normal of every facelet for the given cubelet positions"""
+    half_range = positions[-1]
+    facelets = []       # facelet index -> (cubelet position, normal)
+    index = {}          # (cubelet position, normal) -> facelet index
+    cubelet_stickers = {}
+
+    for face in FACES:
+        normal = get_face_axis(face)
+        axis = [abs(c) for c in normal].index(1)
+        u_axis, v_axis = [a for a in range(3) if a != axis]
+
+        for u in positions:
+            for v in positions:
+                pos = [0, 0, 0]
+                pos[axis] = normal[axis] * half_range
+                pos[u_axis] = u
+                pos[v_axis] = v
+                pos = tuple(pos)
+
+                index[(pos, normal)] = len(facelets)
+                cubelet_stickers.setdefault(pos, []).append((normal, len(facelets)))
+                facelets.append((pos, normal))
+
+    # Only surface cubelets are kept, interior ones are never visible
+    cubelets = list(cubelet_stickers.items())
+
+    # Layer index: (axis, layer coordinate) -> the cubelets and facelets in that layer.
+    # Facelet slots never move (only their colors do), so it is built once per size.
+    layers = {}
+    for cubelet in cubelets:
+        pos, stickers = cubelet
+        for axis in range(3):
+            layer = layers.setdefault((axis, pos[axis]), {'cubelets': [], 'facelets': []})
+            layer['cubelets'].append(cubelet)
+            layer['facelets'].extend(index for normal, index in stickers)
+
+    return {
+        'size': len(positions),
+        'half_range': half_range,
+        'facelets': facelets,
+        'index': index,
+        'cubelets': cubelets,
+        'layers': layers
+    }
+
+def get_face_layer(layout, face, depth=1):
+    """Look up the layer index entry for a face's layer (depth 1 is the outer layer)"""
+    axis = get_face_axis(face)
+    axis_index = [abs(c) for c in axis].index(1)
+    return layout['layers'][(axis_index, axis[axis_index] * (layout['half_range'] - (depth - 1)))]
+
+def build_face_permutation(layout, face, clockwise=True, depth=1):
+    """Build the facelet permutation for a 90 degree turn of a face layer"""
+    axis = get_face_axis(face)
+
+    perm = list(range(len(layout['facelets'])))
+    for source in get_face_layer(layout, face, depth)['facelets']:
+        pos, normal = layout['facelets'][source]
+        target = layout['index'][(rotate_position(pos, axis, clockwise), rotate_vector(normal, axis, clockwise))]
+        perm[target] = source
+
+    return perm
+
+#Move tables
+move_tables = {}  # cube size -> {'perms': {move: permutation}, 'moved': {move: facelets it touches}}
+
+def format_move(face, clockwise=True, double=False, depth=1):
+    """Build move notation: R, R', R2 for outer layers, 2R, 3R' ... for inner slices"""
+    suffix = '2' if double else ('' if clockwise else "'")
+    prefix = str(depth) if depth > 1 else ''
+    return prefix + face + suffix
+
+def get_move_names(size):
+    """Get every move notation the move table of a size holds (U, U', U2, 2U, ...)"""
+    return [format_move(face, clockwise, double, depth)
+            for face in FACES
+            for depth in range(1, get_max_depth(size) + 1)
+            for clockwise, double in ((True, False), (False, False), (True, True))]
+
+def parse_move(move):
+    """Split a move notation into (face, clockwise, double, depth)"""
+    digits = len(move) - len(move.lstrip('0123456789'))
+    depth = int(move[:digits]) if digits else 1
+    face = move[digits]
+    suffix = move[digits + 1:]
+    return face, suffix != "'", suffix == '2', depth
+
+def get_move_base(move):
+    """Strip the ' or 2 suffix from a move (2R' becomes 2R)"""
+    if move.endswith(("'", "2")) and not move[:-1].isdigit():
+        return move[:-1]
+    return move
+
+def get_inverse_move(move):
+    """Get the inverse of a move"""
+    if move.endswith("'"):
+        return get_move_base(move)  # R' becomes R
+    elif move != get_move_base(move):
+        return move      # R2 stays R2 (its own inverse)
+    else:
+        return move + "'" # R becomes R'
+
+# Opposite face pairs, the first face of each pair names the axis direction
+AXIS_FACES = {'U': ('U', 'D'), 'D': ('U', 'D'), 'R': ('R', 'L'), 'L': ('R', 'L'), 'F': ('F', 'B'), 'B': ('F', 'B')}
+
+def simplify_moves(moves, size):
+    """Cancel and merge moves in one pass: layers on one axis commute, so each run of
+    same-axis moves collapses to at most one turn per layer, written in a fixed order
+
+    Each layer keeps the face it was first turned from, so 2D stays 2D and
+    doesn't become 2U' on the middle slice of an odd cube.
+    """
+    groups = []  # stack of [axis face, {layer counted from axis face: (quarter turns, face it was turned from)}]
+
+    for move in moves:
+        face, clockwise, double, depth = parse_move(move)
+        first, _ = AXIS_FACES[face]
+        if face == first:
+            layer, turns = depth, 2 if double else (1 if clockwise else 3)
+        else:
+            # Turning from the opposite face is the same layer turned the other way
+            layer, turns = size + 1 - depth, 2 if double else (3 if clockwise else 1)
+
+        if not groups or groups[-1][0] != first:
+            groups.append([first, {}])
+        layers = groups[-1][1]
+        total, named = layers.get(layer, (0, face))
+        total = (total + turns) % 4
+        if total:
+            layers[layer] = (total, named)
+        else:
+            layers.pop(layer, None)
+            if not layers:
+                # The whole run cancelled, the runs on either side may now merge
+                groups.pop()
+
+    result = []
+    for first, layers in groups:
+        for layer in sorted(layers):
+            turns, face = layers[layer]
+            if face == first:
+                depth = layer
+            else:
+                depth, turns = size + 1 - layer, -turns % 4
+            result.append(format_move(face, turns == 1, turns == 2, depth))
+    return result
+
+def compose_permutations(first, second):
+    """Get the permutation that applies first and then second"""
+    return array('H', map(first.__getitem__, second))
+
+def invert_permutation(perm):
+    """Get the permutation that undoes perm"""
+    inverse = array('H', [0]) * len(perm)
+    for index, source in enumerate(perm):
+        inverse[source] = index
+    return inverse
+
+def power_permutation(perm, exponent):
+    """Apply perm exponent times using fast exponentiation (negative exponents invert)"""
+    if exponent < 0:
+        perm = invert_permutation(perm)
+        exponent = -exponent
+
+    result = array('H', range(len(perm)))
+    while exponent:
+        if exponent & 1:
+            result = compose_permutations(result, perm)
+        perm = compose_permutations(perm, perm)
+        exponent >>= 1
+    return result
+
+def permutation_parity(pieces):
+    """Get 1 for an odd permutation, 0 for an even one"""
+    seen = [False] * len(pieces)
+    parity = 0
+    for start in range(len(pieces)):
+        length = 0
+        slot = start
+        while not seen[slot]:
+            seen[slot] = True
+            slot = pieces[slot]
+            length += 1
+        if length:
+            parity ^= (length - 1) & 1
+    return parity
+
+def sequence_permutation(moves, table):
+    """Collapse a whole move sequence into one facelet permutation"""
+    perms = table['perms']
+    result = array('H', range(table['facelet_count']))
+
+    # Each move only changes the entries for the facelets it touches
+    for move in moves:
+        perm = perms[move]
+        moved = table['moved'][move]
+        values = [result[perm[i]] for i in moved]
+        for i, value in zip(moved, values):
+            result[i] = value
+    return result
+
+def build_move_data(size):
+    """Build the facelet permutation of every move of a cube size, one after another in get_move_names order"""
+    layout = get_layout(size)
+    perms = {}
+    for face in FACES:
+        for depth in range(1, get_max_depth(size) + 1):
+            quarter = array('H', build_face_permutation(layout, face, True, depth))
+            perms[format_move(face, True, False, depth)] = quarter
+            perms[format_move(face, False, False, depth)] = invert_permutation(quarter)
+            perms[format_move(face, True, True, depth)] = power_permutation(quarter, 2)
+
+    data = array('H')
+    for name in get_move_names(size):
+        data.extend(perms[name])
+    return data
+
+def get_move_table(size):
+    """Get the move table for a cube size, building and caching it on first use"""
+    if size in move_tables:
+        return move_tables[size]
+
+    # cube_tables imports TABLE_DIR from here, so it is loaded late
+    from cube_tables import load_array
+
+    names = get_move_names(size)
+    count = len(get_layout(size)['facelets'])
+    data = load_array(f"moves_{size}x{size}.bin", 'H', len(names) * count, lambda: build_move_data(size))
+    perms = {name: data[i * count:(i + 1) * count] for i, name in enumerate(names)}
+
+    table = {
+        'facelet_count': count,
+        'perms': perms,
+        'moved': {name: [i for i, source in enumerate(perm) if source != i] for name, perm in perms.items()}
+    }
+    move_tables[size] = table
+    return table
+
+#Scrambles
+def generate_scramble(size, length, rng=random):
+    """Generate a random scramble, never turning the same layer twice in a row"""
+    faces = ['U', 'D', 'L', 'R', 'F', 'B']
+    modifiers = ['', "'", "2"]
+
+    # Outer layers are enough up to 3x3, bigger cubes also need their inner slices
+    layers = [(face, depth) for face in faces for depth in range(1, size // 2 + 1)]
+
+    scramble = []
+    last_layer = None
+
+    for _ in range(length):
+        # Avoid same layer twice in a row
+        available_layers = [layer for layer in layers if layer != last_layer]
+        face, depth = rng.choice(available_layers)
+        modifier = rng.choice(modifiers)
+
+        scramble.append(format_move(face, modifier != "'", modifier == '2', depth))
+        last_layer = (face, depth)
+
+    return scramble
+
+def main():
+    """Print scrambles from the command line, for batch jobs on headless machines"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate Rubik's Cube scrambles without a display")
+    parser.add_argument('--size', type=int, default=3, help="cube size (default 3)")
+    parser.add_argument('--length', type=int, default=20, help="moves per scramble (default 20)")
+    parser.add_argument('--count', type=int, default=1, help="number of scrambles (default 1)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for _ in range(args.count):
+        print(' '.join(generate_scramble(args.size, args.length, rng)))
+
+if __name__ == "__main__":
+    main()
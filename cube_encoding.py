@@ -0,0 +1,228 @@
+"""Compact state encodings and stable 64-bit hashes for cube states
+
+Every encoding is canonical: colors are first renamed so the cube's
+reference pieces (the centers on odd cubes, the DBL corner on even ones)
+show their home colors. States that only differ by that renaming have
+the same solutions, so they share one encoding and one hash.
+
+    2x2  corner permutation/orientation coordinate, < 3,674,160 (3 bytes)
+    3x3  corner and edge permutation/orientation coordinates (9 bytes)
+    NxN  packed facelets, two facelets per byte
+"""
+import hashlib
+
+from cube_core import FACES, FaceletCube, get_layout, get_face_axis
+
+# Corner and edge slots, U/D sticker first and then counterclockwise seen from
+# outside the cube, so twists add up the same way for every corner
+CORNERS = ['URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB']
+# Edges list their reference sticker first: U/D if they have one, otherwise F/B
+EDGES = ['UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR']
+
+# Home colors of every piece in slot order (colors are face indices in FACES order)
+CORNER_COLORS = [tuple(FACES.index(face) for face in corner) for corner in CORNERS]
+EDGE_COLORS = [tuple(FACES.index(face) for face in edge) for edge in EDGES]
+
+# Color bitmask -> piece, works whatever order the stickers are read in
+CORNER_LOOKUP = {sum(1 << color for color in colors): piece for piece, colors in enumerate(CORNER_COLORS)}
+EDGE_LOOKUP = {sum(1 << color for color in colors): piece for piece, colors in enumerate(EDGE_COLORS)}
+
+TWO_BY_TWO_STATES = 5040 * 729  # 7! corner permutations x 3^6 twists with DBL fixed
+
+piece_facelets = {}  # (cube size, 'corners' or 'edges') -> facelet indices per slot
+
+def get_piece_facelets(size, kind):
+    """Get the facelet indices of every corner slot, or every middle edge slot on odd cubes"""
+    key = (size, kind)
+    if key not in piece_facelets:
+        layout = get_layout(size)
+        half_range = layout['half_range']
+        names = CORNERS if kind == 'corners' else EDGES
+
+        slots = []
+        for name in names:
+            axes = [get_face_axis(face) for face in name]
+            pos = tuple(sum(axis[i] for axis in axes) * half_range for i in range(3))
+            slots.append(tuple(layout['index'][(pos, axis)] for axis in axes))
+        piece_facelets[key] = slots
+    return piece_facelets[key]
+
+def get_color_frame(cube):
+    """Get the color renaming (256-byte translate table) that puts the reference pieces home"""
+    size = cube.size
+    area = size * size
+    rename = list(range(256))
+
+    if size % 2:
+        # Odd cubes: the middle center of each face names that face's color
+        middle = (size // 2) * size + size // 2
+        for face in range(6):
+            rename[cube.facelets[face * area + middle]] = face
+    else:
+        # Even cubes: the piece in the DBL slot names D, B and L, opposite colors follow
+        for face, index in zip((FACES.index('D'), FACES.index('B'), FACES.index('L')),
+                               get_piece_facelets(size, 'corners')[CORNERS.index('DBL')]):
+            color = cube.facelets[index]
+            rename[color] = face
+            rename[color ^ 1] = face ^ 1  # opposite faces are neighbours in FACES
+
+    return bytes(rename)
+
+def canonical_facelets(cube):
+    """Get the facelets with colors renamed into the canonical frame"""
+    return bytes(cube.facelets).translate(get_color_frame(cube))
+
+#Pieces
+def get_corners(facelets, size):
+    """Read corner permutation and orientation: cp[slot] = piece, co[slot] = twist"""
+    cp, co = [], []
+    for slot in get_piece_facelets(size, 'corners'):
+        colors = [facelets[i] for i in slot]
+        cp.append(CORNER_LOOKUP[(1 << colors[0]) | (1 << colors[1]) | (1 << colors[2])])
+        co.append(next(k for k, color in enumerate(colors) if color < 2))  # U and D colors are 0 and 1
+    return cp, co
+
+def set_corners(facelets, size, cp, co):
+    """Write corner pieces into a facelet bytearray"""
+    for slot, piece, twist in zip(get_piece_facelets(size, 'corners'), cp, co):
+        colors = CORNER_COLORS[piece]
+        for k in range(3):
+            facelets[slot[(twist + k) % 3]] = colors[k]
+
+def get_edges(facelets, size):
+    """Read middle edge permutation and orientation: ep[slot] = piece, eo[slot] = flip"""
+    ep, eo = [], []
+    for slot in get_piece_facelets(size, 'edges'):
+        first, second = facelets[slot[0]], facelets[slot[1]]
+        piece = EDGE_LOOKUP[(1 << first) | (1 << second)]
+        ep.append(piece)
+        eo.append(0 if first == EDGE_COLORS[piece][0] else 1)
+    return ep, eo
+
+def set_edges(facelets, size, ep, eo):
+    """Write middle edge pieces into a facelet bytearray"""
+    for slot, piece, flip in zip(get_piece_facelets(size, 'edges'), ep, eo):
+        colors = EDGE_COLORS[piece]
+        facelets[slot[flip]] = colors[0]
+        facelets[slot[1 - flip]] = colors[1]
+
+#Coordinates
+def permutation_rank(perm):
+    """Rank a permutation of 0..n-1 in lexicographic order"""
+    rank = 0
+    remaining = sorted(perm)
+    for value in perm:
+        index = remaining.index(value)
+        rank = rank * len(remaining) + index
+        remaining.pop(index)
+    return rank
+
+def permutation_unrank(rank, n):
+    """Rebuild the permutation of 0..n-1 with the given lexicographic rank"""
+    digits = []
+    for base in range(1, n + 1):
+        digits.append(rank % base)
+        rank //= base
+    remaining = list(range(n))
+    return [remaining.pop(index) for index in reversed(digits)]
+
+def orientation_rank(orientation, base):
+    """Pack all but the last orientation into one number (the last one follows from the rest)"""
+    rank = 0
+    for value in orientation[:-1]:
+        rank = rank * base + value
+    return rank
+
+def orientation_unrank(rank, base, n):
+    """Rebuild n orientations whose sum is a multiple of base"""
+    orientation = [0] * n
+    for i in range(n - 2, -1, -1):
+        orientation[i] = rank % base
+        rank //= base
+    orientation[-1] = -sum(orientation) % base
+    return orientation
+
+#Encodings
+def encode_2x2(cube):
+    """Encode a 2x2 as one integer below 3,674,160 (DBL corner is the fixed reference)"""
+    cp, co = get_corners(canonical_facelets(cube), cube.size)
+
+    # DBL (slot and piece 6) is always home in the canonical frame, drop it
+    dbl = CORNERS.index('DBL')
+    others = [piece - (piece > dbl) for slot, piece in enumerate(cp) if slot != dbl]
+    twists = [twist for slot, twist in enumerate(co) if slot != dbl]
+    return permutation_rank(others) * 729 + orientation_rank(twists, 3)
+
+def decode_2x2(code):
+    """Rebuild a 2x2 cube from encode_2x2's integer"""
+    dbl = CORNERS.index('DBL')
+    others = [piece + (piece >= dbl) for piece in permutation_unrank(code // 729, 7)]
+    twists = orientation_unrank(code % 729, 3, 7)
+
+    cp = others[:dbl] + [dbl] + others[dbl:]
+    co = twists[:dbl] + [0] + twists[dbl:]
+    return build_cube(2, cp, co)
+
+def encode_3x3(cube):
+    """Encode a 3x3 as one integer from its corner and edge coordinates (under 2^67)"""
+    facelets = canonical_facelets(cube)
+    cp, co = get_corners(facelets, 3)
+    ep, eo = get_edges(facelets, 3)
+
+    code = permutation_rank(cp) * 2187 + orientation_rank(co, 3)
+    code = code * 479001600 + permutation_rank(ep)
+    return code * 2048 + orientation_rank(eo, 2)
+
+def decode_3x3(code):
+    """Rebuild a 3x3 cube from encode_3x3's integer"""
+    code, eo = divmod(code, 2048)
+    code, ep = divmod(code, 479001600)
+    cp, co = divmod(code, 2187)
+    return build_cube(3, permutation_unrank(cp, 8), orientation_unrank(co, 3, 8),
+                      permutation_unrank(ep, 12), orientation_unrank(eo, 2, 12))
+
+def build_cube(size, cp, co, ep=None, eo=None):
+    """Make a solved-looking cube and place the given corners (and middle edges)"""
+    cube = FaceletCube(size)
+    facelets = bytearray(cube.facelets)
+    set_corners(facelets, size, cp, co)
+    if ep is not None:
+        set_edges(facelets, size, ep, eo)
+    cube.load_facelets(facelets)
+    return cube
+
+def pack_facelets(cube):
+    """Pack the canonical facelets two per byte"""
+    facelets = canonical_facelets(cube)
+    return bytes(high << 4 | low for high, low in zip(facelets[0::2], facelets[1::2]))
+
+def unpack_facelets(size, data):
+    """Rebuild a cube from pack_facelets' bytes"""
+    facelets = bytearray()
+    for byte in data:
+        facelets.append(byte >> 4)
+        facelets.append(byte & 15)
+    cube = FaceletCube(size)
+    cube.load_facelets(facelets)
+    return cube
+
+def encode_state(cube):
+    """Get the most compact canonical encoding for any cube size, as bytes"""
+    if cube.size == 2:
+        return encode_2x2(cube).to_bytes(3, 'big')
+    if cube.size == 3:
+        return encode_3x3(cube).to_bytes(9, 'big')
+    return pack_facelets(cube)
+
+def decode_state(size, data):
+    """Rebuild a cube from encode_state's bytes"""
+    if size == 2:
+        return decode_2x2(int.from_bytes(data, 'big'))
+    if size == 3:
+        return decode_3x3(int.from_bytes(data, 'big'))
+    return unpack_facelets(size, data)
+
+def state_hash(cube):
+    """Get a 64-bit hash of the canonical state that is stable across runs and machines"""
+    digest = hashlib.blake2b(encode_state(cube), digest_size=8, person=b'cube%d' % cube.size).digest()
+    return int.from_bytes(digest, 'big')
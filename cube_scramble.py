@@ -0,0 +1,101 @@
+"""Random-state scrambles with a background pool
+
+Random move sequences are biased and partly cancel (R L R is just R2 L), so
+their length says little about how scrambled the cube really is. Hard
+scrambles on the 2x2 and 3x3, whose solvers are close to optimal, are made
+the other way round: pick a uniformly random legal state, solve it, and play
+the inverted solution. A random state's length is set by the state, so it is
+checked against the usual length for the size, and a scramble too far off
+(a lucky near-solved state, or a solve that ran out of time) is replaced by
+random moves.
+
+Each of these costs a solve, so a background process keeps a few ready per
+size. Every other size and difficulty, the 4x4 included, gets random moves
+with the cancellations simplified out, topped up to the requested length.
+"""
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import cube_solver
+from cube_core import generate_scramble, get_inverse_move, permutation_parity, simplify_moves
+from cube_encoding import TWO_BY_TWO_STATES, build_cube, decode_2x2, permutation_unrank
+
+SCRAMBLE_TIME_BUDGET = 0.3  # seconds each scramble solve may spend shortening its sequence
+POOL_SIZE = 3               # scrambles kept ready per size
+RANDOM_STATE_LENGTHS = {2: 9, 3: 21}  # usual solution length of a random state, for the sizes that use them
+SCRAMBLE_LENGTH_TOLERANCE = 3         # moves a random-state scramble may differ from the usual length
+
+executor = None     # background process pool, started on the first refill
+ready = {}          # (size, length) -> scrambles waiting to be used
+pending = {}        # (size, length) -> futures of scrambles being made
+
+def random_state(size, rng):
+    """Get a uniformly random legal state of a 2x2 or 3x3"""
+    if size == 2:
+        return decode_2x2(rng.randrange(TWO_BY_TWO_STATES))
+    # Corner and edge permutations must have the same parity, orientations are fixed by the last piece
+    cp = permutation_unrank(rng.randrange(40320), 8)
+    ep = permutation_unrank(rng.randrange(479001600), 12)
+    if permutation_parity(cp) != permutation_parity(ep):
+        ep[0], ep[1] = ep[1], ep[0]
+    co = [rng.randrange(3) for _ in range(7)]
+    eo = [rng.randrange(2) for _ in range(11)]
+    return build_cube(3, cp, co + [-sum(co) % 3], ep, eo + [sum(eo) % 2])
+
+def random_move_scramble(size, length, rng=random):
+    """Get random moves without cancellations, topped up until the sequence has the full length"""
+    scramble = []
+    while len(scramble) < length:
+        scramble = simplify_moves(scramble + generate_scramble(size, length - len(scramble), rng), size)
+    return scramble
+
+def has_random_state(size):
+    """Check if a size gets random-state scrambles"""
+    return size in RANDOM_STATE_LENGTHS and cube_solver.has_solver(size)
+
+def make_scramble(size, length, seed):
+    """Make a scramble by solving a random state, or length random moves when its length is off"""
+    rng = random.Random(seed)
+    cube = random_state(size, rng)
+    solution = cube_solver.find_solution(size, cube.facelets, SCRAMBLE_TIME_BUDGET)
+    if solution is None or abs(len(solution) - RANDOM_STATE_LENGTHS[size]) > SCRAMBLE_LENGTH_TOLERANCE:
+        return random_move_scramble(size, length, rng)
+    return [get_inverse_move(move) for move in reversed(solution)]
+
+#Pool
+def get_executor():
+    """Get the background process pool, starting it on first use"""
+    global executor
+    if executor is None:
+        # Spawned workers never inherit the parent's OpenGL context
+        executor = ProcessPoolExecutor(1, multiprocessing.get_context('spawn'))
+    return executor
+
+def refill(size, length):
+    """Start making random-state scrambles until POOL_SIZE are ready or on the way"""
+    if not has_random_state(size):
+        return
+    key = (size, length)
+    futures = pending.setdefault(key, [])
+
+    # Collect finished scrambles, a failed one is simply made again
+    for future in [future for future in futures if future.done()]:
+        futures.remove(future)
+        if future.exception() is None:
+            ready.setdefault(key, []).append(future.result())
+
+    for _ in range(POOL_SIZE - len(ready.get(key, [])) - len(futures)):
+        futures.append(get_executor().submit(make_scramble, size, length, random.getrandbits(64)))
+
+def take_scramble(size, length, from_random_state=False, rng=random):
+    """Get a scramble right away: a ready random-state one from the pool, otherwise length random moves"""
+    if not from_random_state or not has_random_state(size):
+        return random_move_scramble(size, length, rng)
+    refill(size, length)
+    scrambles = ready.get((size, length))
+    if scrambles:
+        scramble = scrambles.pop(0)
+        refill(size, length)
+        return scramble
+    return random_move_scramble(size, length, rng)
@@ -0,0 +1,74 @@
+"""Parallel IDA* driver
+
+Deep searches are CPU-bound in pure Python, so the tree is split a couple
+of moves below the root and the subtrees are handed to a multiprocessing
+pool. Workers import the problem module themselves, and its tables come
+from memory-mapped files in tables/, so every process reads the same pages
+instead of getting its own copy.
+
+A problem is a module name. The module provides:
+
+    lower_bound(start)                       -> first IDA* bound
+    search_prefixes(start, depth)            -> move prefixes that split the tree
+    search_subtree(start, prefix, bound, stop)
+        -> solution (list of moves) of exactly `bound` moves under prefix, or None;
+           gives up early once stop.is_set()
+
+All subtrees of one bound are searched before the next bound starts, so
+the first solution found is an optimal one. It sets the shared stop event
+and the other workers give up.
+"""
+import importlib
+import multiprocessing
+import os
+
+SPLIT_DEPTH = 2  # moves below the root where the tree is split
+
+stop_event = None  # shared stop flag, set up in each worker by init_worker
+
+def init_worker(event):
+    """Pool initializer: keep the shared stop event"""
+    global stop_event
+    stop_event = event
+
+def search_task(task):
+    """Search one subtree in a worker"""
+    problem, start, prefix, bound = task
+    return importlib.import_module(problem).search_subtree(start, prefix, bound, stop_event)
+
+def parallel_search(problem, start, max_depth, workers=None, split_depth=SPLIT_DEPTH):
+    """Run IDA* for a problem module, on a process pool once bounds get deeper than the split"""
+    module = importlib.import_module(problem)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    pool = None
+    try:
+        for bound in range(module.lower_bound(start), max_depth + 1):
+            if workers == 1 or bound <= split_depth:
+                # Shallow bounds finish faster than a pool can start
+                solution = module.search_subtree(start, (), bound, None)
+            else:
+                if pool is None:
+                    event = multiprocessing.Event()
+                    pool = multiprocessing.Pool(workers, init_worker, (event,))
+                    prefixes = module.search_prefixes(start, split_depth)
+
+                event.clear()
+                solution = None
+                tasks = [(problem, start, prefix, bound) for prefix in prefixes]
+                for found in pool.imap_unordered(search_task, tasks):
+                    if found is not None:
+                        solution = found
+                        event.set()
+                        break
+
+            if solution is not None:
+                return solution
+        return None
+    finally:
+        if pool is not None:
+            # Tasks still queued see the stop event and return at once, so the pool winds down cleanly
+            event.set()
+            pool.close()
+            pool.join()
@@ -0,0 +1,215 @@
+"""Pick the right solver for a cube size
+
+Solver modules are imported on first use, so their tables are only
+built or mapped for the sizes that actually get solved.
+
+Solvers are anytime: a valid solution comes within milliseconds and the
+search keeps looking for shorter ones until its time budget runs out.
+solve_stream yields each of them in turn for headless code. solve_async
+runs the search on a background process instead, so the GLUT main loop
+keeps drawing frames and taking input, and get_progress hands over the
+shorter solutions found so far. cancel stops a running search through a
+flag the solver checks, so the next solve doesn't queue behind it.
+"""
+import importlib
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cube_cache
+from cube_core import FaceletCube, simplify_moves
+
+# Cube size -> solver module with a solve(cube, time_budget, on_solution, stop=None) function,
+# on_solution gets every shorter solution as soon as the solver finds it, and the
+# search gives up once stop.is_set()
+SOLVERS = {
+    2: 'solver_2x2',
+    3: 'solver_3x3',
+    4: 'solver_4x4',
+}
+
+DEFAULT_TIME_BUDGET = 1.0  # seconds a solver may spend shortening its solution
+BACKGROUND_WORKERS = 1     # solves run one at a time, next to the main loop
+
+executor = None                # background process pool, started on the first async solve
+progress_queue = None          # (job id, solution) from the workers, shared with the pool
+cancelled_job = None           # shared with the pool: every job up to this id is cancelled
+job_ids = itertools.count(1)   # id of each background solve, to match progress to its future
+latest_progress = {}           # job id -> shortest solution reported and not yet collected
+cache_lock = threading.Lock()  # results are cached from the executor's callback thread
+
+def has_solver(size):
+    """Check if a cube size has a real solver"""
+    return size in SOLVERS
+
+def find_solution(size, facelets, time_budget=DEFAULT_TIME_BUDGET, on_solution=None, stop=None):
+    """Run the solver for a cube given as facelet colors, skipping the cache
+
+    Returns None if stop was set before any solution was found.
+    """
+    cube = FaceletCube(size)
+    cube.load_facelets(facelets)
+    report = None if on_solution is None else lambda moves: on_solution(simplify_moves(moves, size))
+    solution = importlib.import_module(SOLVERS[size]).solve(cube, time_budget, report, stop=stop)
+    return None if solution is None else simplify_moves(solution, size)
+
+def solve(cube, time_budget=DEFAULT_TIME_BUDGET):
+    """Get a solution (list of moves) for the cube, or None if its size has no solver"""
+    if cube.size not in SOLVERS:
+        return None
+    if cube.is_solved():
+        return []
+
+    # Symmetric positions share one cache entry, so repeats skip the search
+    with cache_lock:
+        solution = cube_cache.lookup(cube)
+    if solution is None:
+        solution = find_solution(cube.size, cube.facelets, time_budget)
+        with cache_lock:
+            cube_cache.store(cube, solution)
+    return solution
+
+def solve_stream(cube, time_budget=DEFAULT_TIME_BUDGET):
+    """Yield shorter and shorter solutions for the cube until the solver's time budget runs out
+
+    The search runs on a thread, so the first solution arrives as soon as it is
+    found. Stopping early leaves the thread to finish its budget on its own.
+    """
+    if cube.size not in SOLVERS:
+        return
+    if cube.is_solved():
+        yield []
+        return
+
+    with cache_lock:
+        solution = cube_cache.lookup(cube)
+    if solution is not None:
+        yield solution
+        return
+
+    # (finished, solution or error) from the search thread
+    found = queue.Queue()
+    snapshot = FaceletCube(cube.size)
+    snapshot.load_facelets(cube.facelets)
+
+    def search():
+        try:
+            final = find_solution(snapshot.size, snapshot.facelets, time_budget,
+                                  lambda moves: found.put((False, moves)))
+            found.put((True, final))
+        except Exception as error:
+            found.put((True, error))
+
+    threading.Thread(target=search, daemon=True).start()
+    best = None
+    while True:
+        finished, result = found.get()
+        if isinstance(result, Exception):
+            raise result
+        if best is None or len(result) < len(best):
+            best = result
+            yield best
+        if finished:
+            with cache_lock:
+                cube_cache.store(snapshot, best)
+            return
+
+#Background solves
+class JobStop:
+    """Stop flag of one background solve, set once cancel() reaches its id"""
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def is_set(self):
+        return cancelled_job.value >= self.job_id
+
+def init_worker(shared_queue, shared_cancelled):
+    """Pool initializer: keep the queue that progress goes back through and the cancel mark"""
+    global progress_queue, cancelled_job
+    progress_queue = shared_queue
+    cancelled_job = shared_cancelled
+
+def solve_job(job_id, size, facelets, time_budget):
+    """Worker side of solve_async: report each shorter solution while searching, None once cancelled"""
+    stop = JobStop(job_id)
+    solution = find_solution(size, facelets, time_budget, lambda moves: progress_queue.put((job_id, moves)), stop)
+    return None if stop.is_set() else solution
+
+def get_executor():
+    """Get the background process pool, starting it on first use"""
+    global executor, progress_queue, cancelled_job
+    if executor is None:
+        # Spawned workers never inherit the parent's OpenGL context
+        context = multiprocessing.get_context('spawn')
+        progress_queue = context.Queue()
+        # Only this process writes it and ids only grow, so it needs no lock
+        cancelled_job = context.RawValue('q', 0)
+        executor = ProcessPoolExecutor(BACKGROUND_WORKERS, context, init_worker, (progress_queue, cancelled_job))
+    return executor
+
+def get_progress(future):
+    """Get the shortest solution a background solve has reported since the last call, or None"""
+    if progress_queue is not None:
+        while True:
+            try:
+                job_id, moves = progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_id <= cancelled_job.value:
+                continue
+            if job_id not in latest_progress or len(moves) < len(latest_progress[job_id]):
+                latest_progress[job_id] = moves
+    job_id = getattr(future, 'job_id', None)
+    # Solves from the game run one at a time, so older ids are finished or abandoned
+    for old in [old for old in latest_progress if job_id is not None and old < job_id]:
+        del latest_progress[old]
+    return latest_progress.pop(job_id, None)
+
+def solve_async(cube, time_budget=DEFAULT_TIME_BUDGET):
+    """Start solving the cube in the background and get a Future for the solution (or None)
+
+    Call get_progress(future) while it runs to pick up shorter solutions as they are found.
+    """
+    global executor
+    future = Future()
+    if cube.size not in SOLVERS or cube.is_solved():
+        future.set_result(solve(cube, time_budget))
+        return future
+
+    with cache_lock:
+        solution = cube_cache.lookup(cube)
+    if solution is not None:
+        future.set_result(solution)
+        return future
+
+    # The worker gets a snapshot, later moves on the live cube don't affect it
+    snapshot = FaceletCube(cube.size)
+    snapshot.load_facelets(cube.facelets)
+    job_id = next(job_ids)
+
+    def remember(done):
+        # A cancelled solve returns None, one that finished before the cancel still gets cached
+        if not done.cancelled() and done.exception() is None and done.result() is not None:
+            with cache_lock:
+                cube_cache.store(snapshot, done.result())
+
+    try:
+        future = get_executor().submit(solve_job, job_id, cube.size, bytes(cube.facelets), time_budget)
+    except BrokenProcessPool:
+        # A worker died (killed, out of memory), start a fresh pool
+        executor = None
+        future = get_executor().submit(solve_job, job_id, cube.size, bytes(cube.facelets), time_budget)
+    future.job_id = job_id
+    future.add_done_callback(remember)
+    return future
+
+def cancel(future):
+    """Cancel a background solve: a queued one never starts, a running one stops searching"""
+    future.cancel()
+    job_id = getattr(future, 'job_id', None)
+    if job_id is not None:
+        cancelled_job.value = max(cancelled_job.value, job_id)
+        latest_progress.pop(job_id, None)
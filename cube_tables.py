@@ -0,0 +1,232 @@
+"""Solver lookup tables on disk
+
+Tables are built once, written next to the move tables in cube_core.TABLE_DIR
+and memory-mapped on later runs. The operating system pages them in on
+demand, so startup stays fast and nothing is copied into Python objects.
+
+Every table gets a checksum file next to it (name + CHECKSUM_SUFFIX). A table
+with the wrong size, without a checksum file (an unfinished build) or whose
+bytes don't match the checksum is rebuilt on load. Each table is checked once
+per run, the first time it is loaded, which takes a few milliseconds. The
+builds have no randomness, so the same checksums come out on every machine.
+"""
+import hashlib
+import mmap
+import os
+from array import array
+
+from cube_core import TABLE_DIR
+
+CHECKSUM_SUFFIX = '.b2'
+CHUNK_ROWS = 256        # rows per task and per checkpoint in build_rows
+CHUNK_STATES = 1 << 16  # states per task in build_layers, which checkpoints once per depth
+UNVISITED = 255         # distance of a state a breadth-first build hasn't reached yet
+
+mapped_tables = {}      # file name -> read-only mmap
+loaded_arrays = {}      # file name -> array
+verified_tables = set()  # file names whose contents matched their checksum this run
+layer_moves = {}        # file name -> NumPy move tables of a breadth-first build, per process
+
+def get_table_path(name):
+    """Get the path of a table file"""
+    return os.path.join(TABLE_DIR, name)
+
+def save_table(name, data):
+    """Write a table through a temporary file so readers never see a half-written one"""
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    path = get_table_path(name)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+#Checksums
+def table_digest(data):
+    """Get the checksum of a table's bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def save_checked_table(name, data):
+    """Write a table and then its checksum (a table without one counts as unfinished)"""
+    save_table(name, data)
+    save_table(name + CHECKSUM_SUFFIX, table_digest(data).encode())
+    verified_tables.add(name)
+
+def is_table_valid(name, length):
+    """Check that a table file exists, has the right size and matches its checksum, reading it once per run"""
+    path = get_table_path(name)
+    checksum_path = path + CHECKSUM_SUFFIX
+    if not os.path.exists(path) or os.path.getsize(path) != length or not os.path.exists(checksum_path):
+        return False
+    if name in verified_tables:
+        return True
+    with open(checksum_path) as f:
+        expected = f.read().strip()
+    with open(path, 'rb') as f:
+        if table_digest(f.read()) != expected:
+            return False
+    verified_tables.add(name)
+    return True
+
+#Loading
+def map_table(name, length, build):
+    """Memory-map a byte table, calling build() to make and save it when missing, unfinished or damaged"""
+    if name not in mapped_tables:
+        if not is_table_valid(name, length):
+            save_checked_table(name, build())
+        with open(get_table_path(name), 'rb') as f:
+            mapped_tables[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped_tables[name]
+
+def load_array(name, typecode, length, build):
+    """Load a small table as an array, calling build() to make and save it when missing, unfinished or damaged"""
+    if name not in loaded_arrays:
+        data = array(typecode)
+        if is_table_valid(name, length * data.itemsize):
+            with open(get_table_path(name), 'rb') as f:
+                data.fromfile(f, length)
+        else:
+            data = array(typecode, build())
+            save_checked_table(name, data.tobytes())
+        loaded_arrays[name] = data
+    return loaded_arrays[name]
+
+def load_rows(spec):
+    """Load a row table described by a spec dict (see build_rows)"""
+    return load_array(spec['name'], spec['typecode'], spec['rows'] * spec['width'], spec['build'])
+
+def map_layers(spec):
+    """Memory-map a breadth-first table described by a spec dict (see build_layers)"""
+    if spec['name'] not in mapped_tables:
+        build_layers(spec)
+    return map_table(spec['name'], spec['length'], None)
+
+#Parallel builds
+def build_chunk(task):
+    """Build rows start..stop of a table and write them into its memory-mapped partial file"""
+    spec, start, stop = task
+    data = array(spec['typecode'], spec['build'](start, stop))
+    offset = start * spec['width'] * data.itemsize
+    with open(get_table_path(spec['name']) + '.partial', 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as output:
+            output[offset:offset + len(data) * data.itemsize] = data.tobytes()
+            output.flush()
+    return start
+
+def build_rows(spec, pool=None):
+    """Build a row table in CHUNK_ROWS pieces, resuming from the chunks a previous run finished
+
+    A row table spec is a dict with the file 'name', array 'typecode', number
+    of 'rows', entries per row ('width') and 'build', a module-level function
+    returning the entries of rows start..stop-1 (all rows when called bare).
+    Chunks run on the given multiprocessing pool, or here when there is none.
+    """
+    name = spec['name']
+    itemsize = array(spec['typecode']).itemsize
+    length = spec['rows'] * spec['width'] * itemsize
+    if is_table_valid(name, length):
+        return False
+
+    # The partial file is the output itself, the progress file lists the finished chunks
+    partial = get_table_path(name) + '.partial'
+    progress = get_table_path(name) + '.progress'
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    done = set()
+    if os.path.exists(partial) and os.path.getsize(partial) == length and os.path.exists(progress):
+        with open(progress) as f:
+            done = {int(line) for line in f if line.strip()}
+    else:
+        with open(partial, 'wb') as f:
+            f.truncate(length)
+        open(progress, 'w').close()
+
+    tasks = [(spec, start, min(start + CHUNK_ROWS, spec['rows']))
+             for start in range(0, spec['rows'], CHUNK_ROWS) if start not in done]
+    results = pool.imap_unordered(build_chunk, tasks) if pool is not None else map(build_chunk, tasks)
+    with open(progress, 'a') as f:
+        for start in results:
+            f.write(f"{start}\n")
+            f.flush()
+
+    save_partial(name)
+    return True
+
+def save_partial(name):
+    """Move a finished partial file into place with its checksum and drop its progress file"""
+    partial = get_table_path(name) + '.partial'
+    with open(partial, 'rb') as f:
+        data = f.read()
+    with open(partial + CHECKSUM_SUFFIX, 'w') as f:
+        f.write(table_digest(data))
+    os.replace(partial, get_table_path(name))
+    os.replace(partial + CHECKSUM_SUFFIX, get_table_path(name) + CHECKSUM_SUFFIX)
+    os.remove(get_table_path(name) + '.progress')
+    verified_tables.add(name)
+
+def expand_chunk(task):
+    """Give depth + 1 to the unvisited neighbours of the depth states in start..stop, tell if there were any"""
+    import numpy as np
+
+    spec, depth, start, stop = task
+    if spec['name'] not in layer_moves:
+        layer_moves[spec['name']] = spec['moves']()
+    first, second = layer_moves[spec['name']]
+    width = second.shape[0]
+    found = False
+    with open(get_table_path(spec['name']) + '.partial', 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as output:
+            # Other workers only ever turn UNVISITED into depth + 1, so their writes can't change this frontier
+            distance = np.frombuffer(output, dtype=np.uint8)
+            a, b = np.divmod(np.flatnonzero(distance[start:stop] == depth) + start, width)
+            for move in range(first.shape[1]):
+                states = first[a, move].astype(np.int64) * width + second[b, move]
+                states = states[distance[states] == UNVISITED]
+                distance[states] = depth + 1
+                found = found or len(states) > 0
+            del distance  # the mmap can't close while NumPy still holds it
+            output.flush()
+    return found
+
+def build_layers(spec, pool=None):
+    """Build a breadth-first distance table one depth at a time, resuming from the depths a previous run finished
+
+    A breadth-first table spec is a dict with the file 'name', its 'length'
+    (one byte per state), the 'goal' state and 'moves', a module-level
+    function returning the NumPy move tables (states x moves) of the two
+    coordinates a state packs, as first * len(second) + second. Each depth's
+    frontier is expanded in CHUNK_STATES pieces on the given multiprocessing
+    pool, or here when there is none.
+    """
+    name, length = spec['name'], spec['length']
+    if is_table_valid(name, length):
+        return False
+
+    # As in build_rows the partial file is the output, the progress file lists the finished depths
+    partial = get_table_path(name) + '.partial'
+    progress = get_table_path(name) + '.progress'
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    depth = 0
+    if os.path.exists(partial) and os.path.getsize(partial) == length and os.path.exists(progress):
+        with open(progress) as f:
+            depth = sum(1 for line in f if line.strip())
+    else:
+        data = bytearray([UNVISITED]) * length
+        data[spec['goal']] = 0
+        with open(partial, 'wb') as f:
+            f.write(data)
+        open(progress, 'w').close()
+
+    # A depth cut off halfway is simply expanded again, its writes are the same every time
+    found = True
+    with open(progress, 'a') as f:
+        while found:
+            tasks = [(spec, depth, start, min(start + CHUNK_STATES, length)) for start in range(0, length, CHUNK_STATES)]
+            results = pool.imap_unordered(expand_chunk, tasks) if pool is not None else map(expand_chunk, tasks)
+            # Every chunk must be done before the depth counts as finished
+            found = any(list(results))
+            f.write(f"{depth}\n")
+            f.flush()
+            depth += 1
+
+    layer_moves.pop(name, None)
+    save_partial(name)
+    return True
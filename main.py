@@ -1,19 +1,29 @@
-from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
+import ctypes
 import math
-import random
 import time
+from array import array
+from collections import OrderedDict
+
+import cube_scramble
+import cube_solver
+from cube_core import (FACE_AXES, FACE_COLOR_ORDER, FaceletCube, format_move, get_cube_positions,
+                       get_face_axis, get_face_layer, get_inverse_move, get_layout, get_max_depth,
+                       get_move_base, get_move_table, parse_move, simplify_moves)
 
 #Window settings
 window_width = 1000
 window_height = 700
 cube_title = b"3D Rubik's Cube Simulator"
+FRAME_RATE = 60          # redraws per second while something moves
+HUD_REFRESH_RATE = 10    # redraws per second while only the HUD changes (timer, solving)
+SIMULATION_RATE = 120    # fixed game logic steps per second, whatever the frame rate
+MAX_CATCH_UP = 0.25      # most seconds of logic run after a stall, the rest is dropped
 
 #Cube parameters
 CUBE_SIZE = 50
 STICKER_OFFSET = 0.51  # Slightly outside cube face
-ANIMATION_SPEED = 5.0  # degrees per frame
+ANIMATION_SPEED = 300.0         # degrees per second a turn animates at
+CELEBRATION_SPIN_SPEED = 120.0  # degrees per second the cube spins while celebrating
 BORDER_WIDTH = 2
 
 #Colors for faces (RGB tuples)
@@ -27,16 +37,6 @@ COLORS = {
     None: (0.1, 0.1, 0.1)    # Black - internal faces
 }
 
-# Face normal vectors
-FACE_NORMALS = {
-    (0, 0, 1): 'W',   # +Z (Up)
-    (0, 0, -1): 'Y',  # -Z (Down)
-    (0, 1, 0): 'B',   # +Y (Front)
-    (0, -1, 0): 'G',  # -Y (Back)
-    (1, 0, 0): 'R',   # +X (Right)
-    (-1, 0, 0): 'O'   # -X (Left)
-}
-
 # Global cube configuration
 cube_config = {
     'size': 3,          # Default to 3x3x3
@@ -45,35 +45,25 @@ cube_config = {
 }
 
 # Difficulty settings
+# Cube sizes offered in the menu
+MAX_CUBE_SIZE = 20
+CUBE_SIZES = list(range(2, MAX_CUBE_SIZE + 1))
+
+# Difficulty settings: scramble length grows with the cube (2x2: 10/20/30, 3x3: 20/40/60, 4x4: 30/60/90, ...)
 DIFFICULTY_LEVELS = {
-    2: {  # 2x2 cube
-        'Easy': 10,
-        'Medium': 20,
-        'Hard': 30
-    },
-    3: {  # 3x3 cube
-        'Easy': 20,
-        'Medium': 40,
-        'Hard': 60
-    },
-    4: {  # 4x4 cube
-        'Easy': 30,
-        'Medium': 60,
-        'Hard': 90
+    size: {
+        'Easy': 10 * (size - 1),
+        'Medium': 20 * (size - 1),
+        'Hard': 30 * (size - 1)
     }
+    for size in CUBE_SIZES
 }
 
 # Statistics tracking
 solve_stats = {
-    '2x2_Easy': {'times': [], 'best_time': None},
-    '2x2_Medium': {'times': [], 'best_time': None},
-    '2x2_Hard': {'times': [], 'best_time': None},
-    '3x3_Easy': {'times': [], 'best_time': None},
-    '3x3_Medium': {'times': [], 'best_time': None},
-    '3x3_Hard': {'times': [], 'best_time': None},
-    '4x4_Easy': {'times': [], 'best_time': None},
-    '4x4_Medium': {'times': [], 'best_time': None},
-    '4x4_Hard': {'times': [], 'best_time': None}
+    f"{size}x{size}_{difficulty}": {'times': [], 'best_time': None}
+    for size in CUBE_SIZES
+    for difficulty in ('Easy', 'Medium', 'Hard')
 }
 
 # Current difficulty
@@ -92,95 +82,15 @@ solution_tracking = {
     'wrong_move_correction': None 
 }
 
-class Cubelet:
-    def __init__(self, pos, cube_size):
-        self.pos = pos  # Position can be fractional for 2x2
-        self.cube_size = cube_size
-        self.stickers = {}
-
-        # Initialize stickers based on position and cube size
-        self.init_stickers()
-
-    def init_stickers(self):
-        """Initialize stickers based on position and cube size"""
-        x, y, z = self.pos
-        half_range = cube_config['half_range']
-
-        print(half_range)
-        # Only assign colors to outer faces
-        if z == half_range:
-            self.stickers[(0, 0, 1)] = 'W'     # Up face (white)
-        if z == -half_range:
-            self.stickers[(0, 0, -1)] = 'Y'    # Down face (yellow)
-        if y == half_range:
-            self.stickers[(0, 1, 0)] = 'B'     # Front face (blue)
-        if y == -half_range:
-            self.stickers[(0, -1, 0)] = 'G'    # Back face (green)
-        if x == half_range:
-            self.stickers[(1, 0, 0)] = 'R'     # Right face (red)
-        if x == -half_range:
-            self.stickers[(-1, 0, 0)] = 'O'    # Left face (orange)
-
-    def rotate_stickers(self, axis, clockwise=True):
-        """Rotate sticker orientations when cubelet rotates"""
-        new_stickers = {}
-
-        for normal, color in self.stickers.items():
-            new_normal = rotate_vector(normal, axis, clockwise)
-            new_stickers[new_normal] = color
-            print(new_stickers)
-        self.stickers = new_stickers
-
-def rotate_vector(vec, axis, clockwise=True):
-    """Rotate a vector 90 degrees around axis"""
-    x, y, z = vec
-    ax, ay, az = axis
-
-    if axis == (0, 0, 1):  # Z-axis rotation
-        if clockwise:
-            return (-y, x, z)
-        else:
-            return (y, -x, z)
-    elif axis == (0, 0, -1):  # -Z-axis rotation
-        if clockwise:
-            return (y, -x, z)
-        else:
-            return (-y, x, z)
-    elif axis == (1, 0, 0):  # X-axis rotation
-        if clockwise:
-            return (x, -z, y)
-        else:
-            return (x, z, -y)
-    elif axis == (-1, 0, 0):  # -X-axis rotation
-        if clockwise:
-            return (x, z, -y)
-        else:
-            return (x, -z, y)
-    elif axis == (0, 1, 0):  # Y-axis rotation
-        if clockwise:
-            return (z, y, -x)
-        else:
-            return (-z, y, x)
-    elif axis == (0, -1, 0):  # -Y-axis rotation
-        if clockwise:
-            return (-z, y, x)
-        else:
-            return (z, y, -x)
-
-    return vec
-
-def rotate_position(pos, axis, clockwise=True):
-    """Rotate position around axis by 90 degrees"""
-    return rotate_vector(pos, axis, clockwise)
-
 # Global state
-cubelets = []
+cube_state = None  # FaceletCube for the current size
 camera = {'pitch': 20, 'yaw': 45, 'distance': 400}
 mouse_state = {'dragging': False, 'last_x': 0, 'last_y': 0}
 move_queue = []
 current_animation = None
 game_state = {
     'move_history': [],
+    'state_hash': 0,  # Running Zobrist hash of cube_state, updated on every move
     'timer_start': 0,
     'timer_running': False,
     'move_count': 0,
@@ -195,12 +105,16 @@ ui_state = {
     'show_help': False,
     'show_menu': True,
     'last_move': None,
-    'animation_speed': ANIMATION_SPEED,
-    'menu_selection': 0,      # 0=2x2, 1=3x3
+    'animation_speed': ANIMATION_SPEED,  # degrees per second
+    'menu_selection': 1,      # index into CUBE_SIZES, 1=3x3
     'difficulty_selection': 0, # 0=Easy, 1=Medium, 2=Hard
     'menu_stage': 'cube_size', # 'cube_size' or 'difficulty'
     'solution_moves': [],
     'show_solution': False,
+    'instant_scramble': True,  # Apply scrambles in one batch instead of animating them
+    'layer_depth': 1,          # Layer turned by face keys, 1 = outer layer
+    'solve_time_budget': 1.0,  # Seconds the solver may spend shortening a solution
+    'solve_job': None,         # Background solve in progress: {'future', 'state_hash', 'start_time'}
     'celebration': {
         'active': False,
         'start_time': 0,
@@ -217,90 +131,43 @@ def setup_cube_size(size):
     global cube_config
 
     cube_config['size'] = size
+    cube_config['half_range'] = (size - 1) / 2
+    cube_config['positions'] = get_cube_positions(size)
+    print(f"Configured for {size}x{size}x{size} cube")
 
-    if size == 2:
-        cube_config['half_range'] = 0.5
-        cube_config['positions'] = [-0.5, 0.5]
-        print("Configured for 2x2x2 cube")
-    elif size == 3:
-        cube_config['half_range'] = 1
-        cube_config['positions'] = [-1, 0, 1]
-        print("Configured for 3x3x3 cube")
-    elif size == 4:
-        cube_config['half_range'] = 1.5
-        cube_config['positions'] = [-1.5, -0.5, 0.5, 1.5]
-        print("Configured for 4x4x4 cube")
-
+    # Facelet geometry and the move table only depend on the size
+    cube_config['layout'] = get_layout(size)
+    cube_config['moves'] = get_move_table(size)
 
 def init_cube():
     """Initialize the cube in solved state based on current size"""
-    global cubelets
-    cubelets = []
+    global cube_state
 
-    positions = cube_config['positions']
     size = cube_config['size']
 
     print(f"Initializing {size}x{size}x{size} cube...")
 
-    for x in positions:
-        for y in positions:
-            for z in positions:
-                cubelets.append(Cubelet((x, y, z), size))
+    cube_state = FaceletCube(size)
+    game_state['state_hash'] = cube_state.hash
 
     #Debug: Check cube initialization
-    visible_faces = 0
-    for cubelet in cubelets:
-        visible_faces += len(cubelet.stickers)
-
     expected_stickers = 6 * size * size  # 6 faces, size*size stickers each
 
-    print(f"Total cubelets: {len(cubelets)}")
-    print(f"Total visible stickers: {visible_faces}")
+    print(f"Total cubelets: {len(cube_config['layout']['cubelets'])}")
+    print(f"Total visible stickers: {len(cube_state.facelets)}")
     print(f"Expected: {expected_stickers} stickers")
 
     # Print face distribution
-    face_counts = {'W': 0, 'Y': 0, 'R': 0, 'O': 0, 'B': 0, 'G': 0}
-    for cubelet in cubelets:
-        for color in cubelet.stickers.values():
-            if color in face_counts:
-                face_counts[color] += 1
+    face_counts = {color: cube_state.facelets.count(i) for i, color in enumerate(FACE_COLOR_ORDER)}
 
     print("Face distribution:", face_counts)
 
 
-def get_face_cubelets(face):
-    """Get cubelets belonging to a face (works for 2x2, 3x3, and 4x4)"""
-    face_cubelets = []
-    half_range = cube_config['half_range']
-
-    #store (axis_index, expected_value)
-    face_axes = {
-        'U': (2, half_range),     # Up face → z = +half_range
-        'D': (2, -half_range),    # Down face → z = -half_range
-        'R': (0, half_range),     # Right face → x = +half_range
-        'L': (0, -half_range),    # Left face → x = -half_range
-        'F': (1, half_range),     # Front face → y = +half_range
-        'B': (1, -half_range)     # Back face → y = -half_range
-    }
-
-    if face in face_axes:
-        axis, expected_value = face_axes[face]
-        for cubelet in cubelets:
-            if cubelet.pos[axis] == expected_value:
-                face_cubelets.append(cubelet)
-
-    return face_cubelets
+def get_cube_scale():
+    """Get the drawing scale that keeps big cubes about as large on screen as a 4x4"""
+    return min(1.0, 4.0 / cube_config['size'])
 
-def get_face_axis(face):
-    """Get rotation axis for face"""
-    axes = {
-        'U': (0, 0, 1),   'D': (0, 0, -1),
-        'R': (1, 0, 0),   'L': (-1, 0, 0),
-        'F': (0, 1, 0),   'B': (0, -1, 0)
-    }
-    return axes.get(face, (0, 0, 1))
-
-def rotate_face(face, clockwise=True, double=False):
+def rotate_face(face, clockwise=True, double=False, depth=None):
     """Add face rotation to animation queue"""
     global move_queue
 
@@ -308,17 +175,17 @@ def rotate_face(face, clockwise=True, double=False):
         print("Please select cube size first!")
         return
 
+    # Inner slices are picked with [ and ], depth 1 is the outer layer
+    if depth is None:
+        depth = ui_state['layer_depth']
+
     if double:
-        move_queue.append({'face': face, 'clockwise': clockwise, 'angle': 180})
+        move_queue.append({'face': face, 'clockwise': clockwise, 'angle': 180, 'depth': depth})
     else:
-        move_queue.append({'face': face, 'clockwise': clockwise, 'angle': 90})
+        move_queue.append({'face': face, 'clockwise': clockwise, 'angle': 90, 'depth': depth})
 
     # Update move history
-    direction = "" if clockwise else "'"
-    if double:
-        direction = "2"
-
-    move_notation = face + direction
+    move_notation = format_move(face, clockwise, double, depth)
     game_state['move_history'].append(move_notation)
 
     # Only increment move count if not scrambling
@@ -343,101 +210,194 @@ def rotate_face(face, clockwise=True, double=False):
 
     print(f"Move queued: {move_notation}")
 
-def draw_sticker(normal, color, size):
-    """Draw a single sticker on cube face with proper normals"""
-    if color is None:
-        return  # Don't draw internal faces
-
-    glColor3f(*COLORS[color])
-
-    # Set the normal for proper lighting
-    glNormal3f(*normal)
+#Retained-mode geometry
+# Vertex buffers for the current cube size: cubelet bodies and stickers are
+# built once per size and drawn with a few calls a frame. Sticker colors sit
+# in their own buffer, rewritten only after the facelets change. While a layer
+# turns, the layer and the rest of the cube are compiled into two display
+# lists when the turn starts and deleted once it commits.
+render_state = {
+    'size': None,
+    'buffers': {},        # 'bodies', 'stickers', 'colors' -> buffer object
+    'body_vertices': 0,
+    'sticker_vertices': 0,
+    'colors_for': None,   # (cube object, hash) the color buffer shows
+    'batch': None,        # (animation key, display list base) of the turn being drawn
+}
 
-    # Calculate sticker vertices based on normal
+def get_sticker_corners(normal, size):
+    """Get a sticker's corners around its cubelet center, wound to match its normal"""
     x, y, z = normal
     half = size * 0.4  # Sticker is smaller than face
     offset = size * STICKER_OFFSET
 
-    glBegin(GL_QUADS)
-
     if abs(z) == 1:  # Top/Bottom faces
-        # Ensure correct winding order for normals
-        if z > 0:  # Top face
-            glVertex3f(-half, -half, z * offset)
-            glVertex3f(half, -half, z * offset)
-            glVertex3f(half, half, z * offset)
-            glVertex3f(-half, half, z * offset)
-        else:  # Bottom face
-            glVertex3f(-half, half, z * offset)
-            glVertex3f(half, half, z * offset)
-            glVertex3f(half, -half, z * offset)
-            glVertex3f(-half, -half, z * offset)
-    elif abs(y) == 1:  # Front/Back faces
-        if y > 0:  # Front face
-            glVertex3f(-half, y * offset, -half)
-            glVertex3f(half, y * offset, -half)
-            glVertex3f(half, y * offset, half)
-            glVertex3f(-half, y * offset, half)
-        else:  # Back face
-            glVertex3f(half, y * offset, -half)
-            glVertex3f(-half, y * offset, -half)
-            glVertex3f(-half, y * offset, half)
-            glVertex3f(half, y * offset, half)
-    elif abs(x) == 1:  # Left/Right faces
-        if x > 0:  # Right face
-            glVertex3f(x * offset, -half, -half)
-            glVertex3f(x * offset, half, -half)
-            glVertex3f(x * offset, half, half)
-            glVertex3f(x * offset, -half, half)
-        else:  # Left face
-            glVertex3f(x * offset, half, -half)
-            glVertex3f(x * offset, -half, -half)
-            glVertex3f(x * offset, -half, half)
-            glVertex3f(x * offset, half, half)
-
-    glEnd()
-
-def draw_cubelet(cubelet):
-    """Draw a single cubelet with stickers"""
-    x, y, z = cubelet.pos
-
-    # Adjust spacing based on cube size
+        if z > 0:
+            return [(-half, -half, z * offset), (half, -half, z * offset), (half, half, z * offset), (-half, half, z * offset)]
+        return [(-half, half, z * offset), (half, half, z * offset), (half, -half, z * offset), (-half, -half, z * offset)]
+    if abs(y) == 1:  # Front/Back faces
+        if y > 0:
+            return [(-half, y * offset, -half), (half, y * offset, -half), (half, y * offset, half), (-half, y * offset, half)]
+        return [(half, y * offset, -half), (-half, y * offset, -half), (-half, y * offset, half), (half, y * offset, half)]
+    # Left/Right faces
+    if x > 0:
+        return [(x * offset, -half, -half), (x * offset, half, -half), (x * offset, half, half), (x * offset, -half, half)]
+    return [(x * offset, half, -half), (x * offset, -half, -half), (x * offset, -half, half), (x * offset, half, half)]
+
+def get_body_faces(size):
+    """Get the six faces of a cubelet body of the given edge length as (normal, corners)"""
+    # Same winding as the stickers, pushed out to the body's corners
+    half = size / 2
+    return [(normal, [tuple(half if c > 0 else -half for c in corner) for corner in get_sticker_corners(normal, size)])
+            for normal in FACE_AXES.values()]
+
+def upload_buffer(target, buffer, data, usage):
+    """Fill a buffer object with raw bytes"""
+    glBindBuffer(target, buffer)
+    glBufferData(target, len(data), data, usage)
+    glBindBuffer(target, 0)
+
+def build_render_geometry():
+    """Build the vertex buffers for the current cube size"""
+    layout = cube_config['layout']
     spacing = CUBE_SIZE * 1.1
 
-    glPushMatrix()
-    glTranslatef(x * spacing, y * spacing, z * spacing)
+    # Bodies: 24 vertices per cubelet, position and normal interleaved
+    bodies = array('f')
+    body_faces = get_body_faces(CUBE_SIZE * 0.9)
+    for pos, stickers in layout['cubelets']:
+        for normal, corners in body_faces:
+            for corner in corners:
+                bodies.extend(pos[k] * spacing + corner[k] for k in range(3))
+                bodies.extend(normal)
+
+    # Stickers: 4 vertices per facelet in facelet order, so colors follow the facelet array
+    stickers = array('f')
+    for pos, normal in layout['facelets']:
+        for corner in get_sticker_corners(normal, CUBE_SIZE):
+            stickers.extend(pos[k] * spacing + corner[k] for k in range(3))
+
+    free_render_geometry()
+    buffers = dict(zip(('bodies', 'stickers', 'colors'), glGenBuffers(3)))
+    upload_buffer(GL_ARRAY_BUFFER, buffers['bodies'], bodies.tobytes(), GL_STATIC_DRAW)
+    upload_buffer(GL_ARRAY_BUFFER, buffers['stickers'], stickers.tobytes(), GL_STATIC_DRAW)
+    upload_buffer(GL_ARRAY_BUFFER, buffers['colors'], bytes(len(stickers)), GL_DYNAMIC_DRAW)
+
+    render_state['size'] = cube_config['size']
+    render_state['buffers'] = buffers
+    render_state['body_vertices'] = len(bodies) // 6
+    render_state['sticker_vertices'] = len(stickers) // 3
+
+def free_render_geometry():
+    """Delete the buffers of the previous cube size"""
+    free_animation_batch()
+    buffers = list(render_state['buffers'].values())
+    if buffers:
+        glDeleteBuffers(len(buffers), buffers)
+    render_state['buffers'] = {}
+    render_state['colors_for'] = None
+
+def update_sticker_colors():
+    """Rewrite the color buffer if the facelets changed since it was last written"""
+    key = (id(cube_state), cube_state.hash)
+    if render_state['colors_for'] == key:
+        return
 
-    # Draw core cube (dark) with proper normal
+    # Each facelet's color, repeated for its 4 vertices
+    palette = [bytes(round(c * 255) for c in COLORS[letter]) * 4 for letter in FACE_COLOR_ORDER]
+    data = b''.join(map(palette.__getitem__, cube_state.facelets))
+    glBindBuffer(GL_ARRAY_BUFFER, render_state['buffers']['colors'])
+    glBufferSubData(GL_ARRAY_BUFFER, 0, len(data), data)
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+    render_state['colors_for'] = key
+
+def get_layer_indices(face, depth):
+    """Get vertex indices of bodies and stickers outside a layer and inside it"""
+    layout = cube_config['layout']
+    layer = get_face_layer(layout, face, depth)
+    in_layer = {pos for pos, stickers in layer['cubelets']}
+    layer_facelets = set(layer['facelets'])
+
+    body_sets = (array('I'), array('I'))
+    for k, (pos, stickers) in enumerate(layout['cubelets']):
+        body_sets[pos in in_layer].extend(range(24 * k, 24 * k + 24))
+    sticker_sets = (array('I'), array('I'))
+    for index in range(len(layout['facelets'])):
+        sticker_sets[index in layer_facelets].extend(range(4 * index, 4 * index + 4))
+    return body_sets, sticker_sets
+
+def start_animation_batch(key, face, depth):
+    """Compile the still part of the cube and the turning layer into two display lists"""
+    free_animation_batch()
+    (bodies_out, bodies_in), (stickers_out, stickers_in) = get_layer_indices(face, depth)
+    base = glGenLists(2)
+    glNewList(base, GL_COMPILE)
+    draw_cube_part(bodies_out, stickers_out)
+    glEndList()
+    glNewList(base + 1, GL_COMPILE)
+    draw_cube_part(bodies_in, stickers_in)
+    glEndList()
+    render_state['batch'] = (key, base)
+
+def free_animation_batch():
+    """Delete the display lists of the last turn"""
+    if render_state['batch'] is not None:
+        glDeleteLists(render_state['batch'][1], 2)
+        render_state['batch'] = None
+
+def draw_quads(count, indices=None):
+    """Draw the bound vertex arrays: all of them, or the vertices at the given indices"""
+    if indices is None:
+        glDrawArrays(GL_QUADS, 0, count)
+    elif indices:
+        glDrawElements(GL_QUADS, len(indices), GL_UNSIGNED_INT, (ctypes.c_uint * len(indices)).from_buffer(indices))
+
+def draw_cube_part(bodies=None, stickers=None):
+    """Draw cubelet bodies and stickers, the whole cube unless index arrays pick a part"""
+    buffers = render_state['buffers']
+    glEnableClientState(GL_VERTEX_ARRAY)
+
+    # Draw core cubes (dark), lit
     glColor3f(0.1, 0.1, 0.1)
-    glNormal3f(0, 0, 1)  # Default normal
-    glutSolidCube(CUBE_SIZE * 0.9)
+    glEnableClientState(GL_NORMAL_ARRAY)
+    glBindBuffer(GL_ARRAY_BUFFER, buffers['bodies'])
+    glVertexPointer(3, GL_FLOAT, 24, ctypes.c_void_p(0))
+    glNormalPointer(GL_FLOAT, 24, ctypes.c_void_p(12))
+    draw_quads(render_state['body_vertices'], bodies)
+    glDisableClientState(GL_NORMAL_ARRAY)
 
     # Disable lighting for stickers to get pure colors
     glDisable(GL_LIGHTING)
-
-    # Draw stickers
-    for normal, color in cubelet.stickers.items():
-        draw_sticker(normal, color, CUBE_SIZE)
-
-    # Re-enable lighting
+    glEnableClientState(GL_COLOR_ARRAY)
+    glBindBuffer(GL_ARRAY_BUFFER, buffers['colors'])
+    glColorPointer(3, GL_UNSIGNED_BYTE, 0, ctypes.c_void_p(0))
+    glBindBuffer(GL_ARRAY_BUFFER, buffers['stickers'])
+    glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+    draw_quads(render_state['sticker_vertices'], stickers)
+    glDisableClientState(GL_COLOR_ARRAY)
     glEnable(GL_LIGHTING)
 
-    glPopMatrix()
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+    glDisableClientState(GL_VERTEX_ARRAY)
 
 def draw_cube():
     """Draw entire cube"""
-    for cubelet in cubelets:
-        draw_cubelet(cubelet)
+    draw_cube_part()
 
 def draw_animated_cube():
     """Draw cube with current animation"""
-    global current_animation
+    if render_state['size'] != cube_config['size']:
+        build_render_geometry()
+    update_sticker_colors()
 
     if current_animation is None:
+        # The last turn has committed, its batch is stale
+        free_animation_batch()
         draw_cube()
         return
 
     face = current_animation['face']
+    depth = current_animation['depth']
     axis = get_face_axis(face)
     angle = current_animation['current_angle']
     clockwise = current_animation['clockwise']
@@ -445,20 +405,19 @@ def draw_animated_cube():
     if not clockwise:
         angle = -angle
 
-    face_cubelets = get_face_cubelets(face)
+    # The facelets only change when a turn commits, so they identify the turn with its layer
+    key = (face, depth, id(cube_state), cube_state.hash)
+    if render_state['batch'] is None or render_state['batch'][0] != key:
+        start_animation_batch(key, face, depth)
+    base = render_state['batch'][1]
 
     # Draw non-rotating cubelets
-    for cubelet in cubelets:
-        if cubelet not in face_cubelets:
-            draw_cubelet(cubelet)
+    glCallList(base)
 
     # Draw rotating cubelets with transformation
     glPushMatrix()
     glRotatef(angle, *axis)
-
-    for cubelet in face_cubelets:
-        draw_cubelet(cubelet)
-
+    glCallList(base + 1)
     glPopMatrix()
 
 def setup_camera():
@@ -510,22 +469,151 @@ def setup_lighting():
     glMaterialfv(GL_FRONT_AND_BACK, GL_SHININESS, [50.0])
     glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, [0.2, 0.2, 0.2, 1.0])
 
-def draw_text(x, y, text, font=GLUT_BITMAP_HELVETICA_18):
-    """Draw 2D text overlay"""
-    glColor3f(1.0, 1.0, 1.0)
+#HUD text
+# The GLUT bitmap fonts are drawn once into a texture atlas. Each string the
+# HUD shows is compiled into a display list of textured quads and kept while
+# it is in use, so unchanged lines (mode, stats, help, solution) cost one call
+# a frame and only changing ones such as the timer are rebuilt. Text is drawn
+# between begin_overlay and end_overlay, which set up the 2D view once a frame.
+ATLAS_WIDTH = 1024
+TEXT_CACHE_SIZE = 128  # compiled strings kept before the least recently used is deleted
+
+text_state = {
+    'atlas': None,                # texture holding every glyph of every HUD font
+    'glyphs': {},                 # font -> {char: (advance, quad corners, texture corners)}
+    'strings': OrderedDict(),     # (font, text) -> display list
+}
+
+def get_hud_fonts():
+    """Get the bitmap fonts the HUD uses"""
+    return [GLUT_BITMAP_HELVETICA_12, GLUT_BITMAP_HELVETICA_18, GLUT_BITMAP_TIMES_ROMAN_24]
+
+def build_text_atlas():
+    """Draw every printable character of the HUD fonts into a texture through a framebuffer"""
+    # Lay out one cell per glyph, roomy enough for overhangs and descenders
+    cells = []
+    x = y = row_height = 0
+    for font in get_hud_fonts():
+        line = glutBitmapHeight(font)
+        margin = line // 2
+        for code in range(32, 127):
+            advance = glutBitmapWidth(font, code)
+            width, height = advance + 2 * margin, 2 * line
+            if x + width > ATLAS_WIDTH:
+                x, y, row_height = 0, y + row_height, 0
+            cells.append((font, chr(code), advance, x, y, width, height, margin))
+            x += width
+            row_height = max(row_height, height)
+    atlas_height = y + row_height
+
+    atlas = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, atlas)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, ATLAS_WIDTH, atlas_height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+    glBindTexture(GL_TEXTURE_2D, 0)
+
+    # White glyphs on a clear background, so the texture's alpha is the glyph mask
+    previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+    framebuffer = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+    glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, atlas, 0)
+    glPushAttrib(GL_ENABLE_BIT | GL_VIEWPORT_BIT | GL_COLOR_BUFFER_BIT | GL_CURRENT_BIT)
+    glDisable(GL_LIGHTING)
+    glDisable(GL_DEPTH_TEST)
+    glDisable(GL_BLEND)
+    glViewport(0, 0, ATLAS_WIDTH, atlas_height)
+    glClearColor(0.0, 0.0, 0.0, 0.0)
+    glClear(GL_COLOR_BUFFER_BIT)
     glMatrixMode(GL_PROJECTION)
     glPushMatrix()
     glLoadIdentity()
-    gluOrtho2D(0, window_width, 0, window_height)
+    gluOrtho2D(0, ATLAS_WIDTH, 0, atlas_height)
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
 
+    glColor4f(1.0, 1.0, 1.0, 1.0)
+    glyphs = {}
+    for font, char, advance, x, y, width, height, margin in cells:
+        baseline = height // 4
+        glRasterPos2f(x + margin, y + baseline)
+        glutBitmapCharacter(font, ord(char))
+        corners = (-margin, -baseline, width - margin, height - baseline)
+        texture = (x / ATLAS_WIDTH, y / atlas_height, (x + width) / ATLAS_WIDTH, (y + height) / atlas_height)
+        glyphs.setdefault(font.value, {})[char] = (advance, corners, texture)
+
+    glPopMatrix()
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
+    glPopAttrib()
+    glBindFramebuffer(GL_FRAMEBUFFER, previous)
+    glDeleteFramebuffers(1, [framebuffer])
+
+    text_state['atlas'] = atlas
+    text_state['glyphs'] = glyphs
+
+def get_string_list(text, font):
+    """Get the display list that draws a string from the atlas, compiling it on first use"""
+    key = (font.value, text)
+    strings = text_state['strings']
+    if key in strings:
+        strings.move_to_end(key)
+        return strings[key]
+
+    # Quads for each glyph, from the origin along the baseline like glutBitmapCharacter
+    glyphs = text_state['glyphs'][font.value]
+    text_list = glGenLists(1)
+    glNewList(text_list, GL_COMPILE)
+    glBegin(GL_QUADS)
+    pen = 0
+    for char in text:
+        if char not in glyphs:
+            continue
+        advance, (x0, y0, x1, y1), (s0, t0, s1, t1) = glyphs[char]
+        glTexCoord2f(s0, t0)
+        glVertex2f(pen + x0, y0)
+        glTexCoord2f(s1, t0)
+        glVertex2f(pen + x1, y0)
+        glTexCoord2f(s1, t1)
+        glVertex2f(pen + x1, y1)
+        glTexCoord2f(s0, t1)
+        glVertex2f(pen + x0, y1)
+        pen += advance
+    glEnd()
+    glEndList()
+
+    strings[key] = text_list
+    if len(strings) > TEXT_CACHE_SIZE:
+        glDeleteLists(strings.popitem(last=False)[1], 1)
+    return text_list
+
+def begin_overlay():
+    """Switch to the 2D window view with the glyph atlas bound, once a frame before any HUD drawing"""
+    if text_state['atlas'] is None:
+        build_text_atlas()
+
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    gluOrtho2D(0, window_width, 0, window_height)
     glMatrixMode(GL_MODELVIEW)
     glPushMatrix()
     glLoadIdentity()
 
+    # Texels outside the glyphs are dropped, like the unset bits of a bitmap
     glDisable(GL_LIGHTING)
-    glRasterPos2f(x, y)
-    for char in text:
-        glutBitmapCharacter(font, ord(char))
+    glBindTexture(GL_TEXTURE_2D, text_state['atlas'])
+    glEnable(GL_TEXTURE_2D)
+    glAlphaFunc(GL_GREATER, 0.0)
+    glEnable(GL_ALPHA_TEST)
+
+def end_overlay():
+    """Go back to the 3D view"""
+    glDisable(GL_ALPHA_TEST)
+    glDisable(GL_TEXTURE_2D)
+    glBindTexture(GL_TEXTURE_2D, 0)
     glEnable(GL_LIGHTING)
 
     glPopMatrix()
@@ -533,25 +621,30 @@ def draw_text(x, y, text, font=GLUT_BITMAP_HELVETICA_18):
     glPopMatrix()
     glMatrixMode(GL_MODELVIEW)
 
+def draw_string(x, y, text, font):
+    """Draw a string in the current color with its baseline starting at window position (x, y)"""
+    glPushMatrix()
+    glTranslatef(int(x), int(y), 0)
+    glCallList(get_string_list(text, font))
+    glPopMatrix()
+
+def draw_text(x, y, text, font=None):
+    """Draw 2D text overlay"""
+    if font is None:
+        font = GLUT_BITMAP_HELVETICA_18
+    glColor3f(1.0, 1.0, 1.0)
+    draw_string(x, y, text, font)
+
 def draw_menu():
     """Draw cube size and difficulty selection menu"""
     if not ui_state['show_menu']:
         return
 
     # Draw semi-transparent overlay
-    glDisable(GL_LIGHTING)
+    glDisable(GL_TEXTURE_2D)
     glEnable(GL_BLEND)
     glColor4f(0.0, 0.0, 0.0, 0.7)
 
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    gluOrtho2D(0, window_width, 0, window_height)
-
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-
     # Draw background rectangle
     glBegin(GL_QUADS)
     glVertex2f(0, 0)
@@ -560,12 +653,8 @@ def draw_menu():
     glVertex2f(0, window_height)
     glEnd()
 
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-
     glDisable(GL_BLEND)
+    glEnable(GL_TEXTURE_2D)
 
     center_x = window_width // 2 - 200
     center_y = window_height // 2
@@ -575,32 +664,32 @@ def draw_menu():
     else:  # difficulty selection
         draw_difficulty_menu(center_x, center_y)
 
-    glEnable(GL_LIGHTING)
-
 def draw_cube_size_menu(center_x, center_y):
-    """Draw cube size selection with 4x4 option"""
+    """Draw cube size selection (2x2 up to MAX_CUBE_SIZE)"""
     draw_text(center_x, center_y + 150, "3D Rubik's Cube Simulator", GLUT_BITMAP_TIMES_ROMAN_24)
     draw_text(center_x, center_y + 100, "Select Cube Size:", GLUT_BITMAP_HELVETICA_18)
 
-    # Draw options with selection indicator
-    options = ["2x2x2 Cube", "3x3x3 Cube", "4x4x4 Cube"]
+    # Only a window of five sizes around the selection fits on screen
+    selection = ui_state['menu_selection']
+    first = max(0, min(selection - 2, len(CUBE_SIZES) - 5))
 
-    for i, option in enumerate(options):
-        y_pos = center_y + 50 - i * 30
-        if ui_state['menu_selection'] == i:
+    for row, i in enumerate(range(first, min(first + 5, len(CUBE_SIZES)))):
+        size = CUBE_SIZES[i]
+        option = f"{size}x{size}x{size} Cube"
+        y_pos = center_y + 50 - row * 30
+        if selection == i:
             draw_text(center_x, y_pos, f"> {option}", GLUT_BITMAP_HELVETICA_18)
         else:
             draw_text(center_x, y_pos, f"  {option}", GLUT_BITMAP_HELVETICA_18)
 
-    draw_text(center_x, center_y - 50, "Use UP/DOWN arrows to select", GLUT_BITMAP_HELVETICA_12)
-    draw_text(center_x, center_y - 70, "Press ENTER to continue", GLUT_BITMAP_HELVETICA_12)
+    draw_text(center_x, center_y - 110, "Use UP/DOWN arrows to select", GLUT_BITMAP_HELVETICA_12)
+    draw_text(center_x, center_y - 130, "Press ENTER to continue", GLUT_BITMAP_HELVETICA_12)
 
 
 
 def draw_difficulty_menu(center_x, center_y):
-    """Draw difficulty selection with 4x4 support"""
-    cube_sizes = [2, 3, 4]
-    selected_cube_size = cube_sizes[ui_state['menu_selection']]
+    """Draw difficulty selection for the selected cube size"""
+    selected_cube_size = CUBE_SIZES[ui_state['menu_selection']]
 
     draw_text(center_x, center_y + 150, f"Select Difficulty for {selected_cube_size}x{selected_cube_size} Cube:", GLUT_BITMAP_HELVETICA_18)
 
@@ -608,7 +697,7 @@ def draw_difficulty_menu(center_x, center_y):
 
     for i, difficulty in enumerate(difficulties):
         y_pos = center_y + 80 - i * 50
-        scramble_moves = DIFFICULTY_LEVELS[selected_cube_size][difficulty]
+        scramble_label = get_scramble_label(selected_cube_size, difficulty)
 
         # Get stats for this mode
         solve_count = get_solve_count(selected_cube_size, difficulty)
@@ -618,7 +707,7 @@ def draw_difficulty_menu(center_x, center_y):
         prefix = "> " if ui_state['difficulty_selection'] == i else "  "
 
         # Main difficulty info
-        main_text = f"{prefix}{difficulty} - {scramble_moves} moves"
+        main_text = f"{prefix}{difficulty} - {scramble_label}"
         draw_text(center_x, y_pos, main_text, GLUT_BITMAP_HELVETICA_18)
 
         # Stats
@@ -642,8 +731,8 @@ def draw_ui():
 
     # Current mode display (always at top)
     cube_size = cube_config['size']
-    scramble_moves = get_scramble_length()
-    mode_text = f"Mode: {cube_size}x{cube_size} {current_difficulty} ({scramble_moves} moves)"
+    scramble_label = get_scramble_label(cube_size, current_difficulty)
+    mode_text = f"Mode: {cube_size}x{cube_size} {current_difficulty} ({scramble_label})"
     draw_text(10, window_height - 30, mode_text, GLUT_BITMAP_HELVETICA_18)
 
     # Current mode stats
@@ -665,15 +754,19 @@ def draw_ui():
     draw_text(10, window_height - 90, timer_text)
     draw_text(10, window_height - 120, f"Moves: {game_state['move_count']}")
 
+    # Selected layer for face keys, only bigger cubes have inner slices
+    if get_max_depth(cube_size) > 1:
+        draw_text(10, window_height - 150, f"Layer: {ui_state['layer_depth']} ([ / ] to change)", GLUT_BITMAP_HELVETICA_12)
+
     # Double move indicator
     global double_move_pending
     if double_move_pending:
         glColor3f(1.0, 1.0, 0.0)  # Yellow color for double move indicator
-        draw_text(10, window_height - 150, "Double Move Mode - Press face key!")
+        draw_text(10, window_height - 175, "Double Move Mode - Press face key!")
         glColor3f(1.0, 1.0, 1.0)  # Reset to white
-        next_line = 180
+        next_line = 205
     else:
-        next_line = 150
+        next_line = 175
 
     # Last move with color feedback
     if ui_state['last_move']:
@@ -711,6 +804,18 @@ def draw_ui():
             glColor3f(1.0, 1.0, 1.0)  # Reset to white
             next_line += 30
 
+    # Background solve status
+    if ui_state['solve_job'] is not None:
+        elapsed = time.time() - ui_state['solve_job']['start_time']
+        glColor3f(1.0, 1.0, 0.0)  # Yellow while waiting
+        if ui_state['solution_moves']:
+            status = f"Solving... {elapsed:.1f}s, best so far {len(ui_state['solution_moves'])} moves (C to cancel)"
+        else:
+            status = f"Solving... {elapsed:.1f}s (C to cancel)"
+        draw_text(10, window_height - next_line, status)
+        glColor3f(1.0, 1.0, 1.0)  # Reset to white
+        next_line += 30
+
     # Show solution moves if available
     if ui_state['show_solution'] and ui_state['solution_moves']:
         draw_text(10, window_height - next_line, "Solution moves:")
@@ -722,31 +827,11 @@ def draw_ui():
 
         for i in range(0, len(solution), 8):
             chunk = solution[i:i+8]
-            line_text = ""
-
-            # Build the line text first
-            for j, move in enumerate(chunk):
-                if j > 0:
-                    line_text += " "
-                line_text += move
 
-            # Now draw each move with appropriate color
+            # Draw each move with appropriate color
             x_start = 10
             current_x = x_start
 
-            # Disable lighting for text rendering
-            glDisable(GL_LIGHTING)
-
-            # Set up 2D projection for text
-            glMatrixMode(GL_PROJECTION)
-            glPushMatrix()
-            glLoadIdentity()
-            gluOrtho2D(0, window_width, 0, window_height)
-
-            glMatrixMode(GL_MODELVIEW)
-            glPushMatrix()
-            glLoadIdentity()
-
             for j, move in enumerate(chunk):
                 move_index = i + j
 
@@ -766,23 +851,12 @@ def draw_ui():
                     glColor3f(1.0, 1.0, 1.0)
 
                 # Draw the move
-                glRasterPos2f(current_x, window_height - next_line)
-                for char in move:
-                    glutBitmapCharacter(GLUT_BITMAP_HELVETICA_12, ord(char))
+                draw_string(current_x, window_height - next_line, move, GLUT_BITMAP_HELVETICA_12)
 
                 # Calculate approximate width and move to next position
                 move_width = len(move) * 7  # Approximate character width
                 current_x += move_width + 10  # Add spacing between moves
 
-            # Restore matrices
-            glPopMatrix()
-            glMatrixMode(GL_PROJECTION)
-            glPopMatrix()
-            glMatrixMode(GL_MODELVIEW)
-
-            # Re-enable lighting
-            glEnable(GL_LIGHTING)
-
             next_line += 25
 
     # Reset color to white for subsequent text
@@ -798,9 +872,11 @@ def draw_ui():
             "U/D/L/R/F/B - Face rotations",
             "Shift + key - Prime moves",
             "2 + key - Double moves",
+            "[ / ] - Select inner layer",
             "S - Scramble",
+            "I - Toggle instant scramble",
             "V - Show solution moves",
-            "C - Hide solution",
+            "C - Hide solution / cancel solving",
             "E - Enable/Disable move validation",
             "Space - Reset",
             "T - Toggle timer",
@@ -819,34 +895,96 @@ def get_scramble_length():
 
 def show_solution():
     """Display the solution moves with difficulty context"""
+    if ui_state['solve_job'] is not None:
+        print("Still solving, press C to cancel")
+        return
+
+    # Solve the state the cube will be in once queued moves have played
+    finish_pending_moves()
+
+    if cube_solver.has_solver(cube_config['size']):
+        if cube_state.is_solved():
+            print("Cube is already solved!")
+            return
+
+        # The search runs in a background process, run_update picks up its solutions
+        ui_state['solution_moves'] = []
+        ui_state['show_solution'] = False
+        ui_state['solve_job'] = {
+            'future': cube_solver.solve_async(cube_state, ui_state['solve_time_budget']),
+            'state_hash': cube_state.hash,
+            'start_time': time.time()
+        }
+        return
+
     if not game_state['move_history'] or not game_state['scrambled']:
         print("No scramble to solve!")
         return
 
-    # Generate solution moves
+    # No solver for this size yet, undo the history instead
     solution_moves = []
     for move in reversed(game_state['move_history']):
         inverse = get_inverse_move(move)
         solution_moves.append(inverse)
+    present_solution(simplify_moves(solution_moves, cube_config['size']))
 
-    scramble_moves = get_scramble_length()
-    print(f"Original scramble ({current_difficulty} - {scramble_moves} moves): {' '.join(game_state['move_history'])}")
-    print(f"Solution moves: {' '.join(solution_moves)}")
+def present_solution(solution_moves):
+    """Print the solution and show it in the UI"""
+    scramble_label = get_scramble_label(cube_config['size'], current_difficulty)
+    print(f"Original scramble ({current_difficulty} - {scramble_label}): {' '.join(game_state['move_history'])}")
+    print(f"Solution moves ({len(solution_moves)}): {' '.join(solution_moves)}")
 
     # Store solution for UI display
     ui_state['solution_moves'] = solution_moves
     ui_state['show_solution'] = True
 
-def get_inverse_move(move):
-    """Get the inverse of a move"""
-    if move.endswith("'"):
-        return move[0]  # R' becomes R
-    elif move.endswith("2"):
-        return move      # R2 stays R2 (its own inverse)
-    else:
-        return move + "'" # R becomes R'
+def poll_solver():
+    """Show each shorter solution from the background solve as it comes in, then the final one"""
+    job = ui_state['solve_job']
+    if job is None:
+        return
+
+    # Moves made while solving leave the search working on an old state
+    if cube_state.hash != job['state_hash']:
+        cancel_solve()
+        if ui_state['show_solution'] and ui_state['solution_moves']:
+            print("Cube changed while solving, keeping the solution found so far")
+        else:
+            print("Cube changed while solving, press V to solve again")
+        return
+
+    # Validation steps through the shown solution, so it must not change under it
+    better = cube_solver.get_progress(job['future'])
+    if better is not None and not solution_tracking['enabled']:
+        ui_state['solution_moves'] = better
+        ui_state['show_solution'] = True
+
+    if not job['future'].done():
+        return
+    ui_state['solve_job'] = None
+
+    try:
+        solution_moves = job['future'].result()
+    except Exception as error:
+        print(f"Solver failed: {error}")
+        return
+
+    print(f"Solved in {time.time() - job['start_time']:.2f}s")
+    if solution_tracking['enabled']:
+        print(f"Found a {len(solution_moves)} move solution, keeping the one being validated")
+        return
+    present_solution(solution_moves)
+
+def cancel_solve():
+    """Stop a background solve, the worker gives up its search right away"""
+    job = ui_state['solve_job']
+    if job is None:
+        return False
+    cube_solver.cancel(job['future'])
+    ui_state['solve_job'] = None
+    return True
 
-def scramble_cube(moves=None):
+def scramble_cube(moves=None, instant=None):
     """Generate random scramble based on cube size"""
     if not game_state['cube_selected']:
         print("Please select cube size first!")
@@ -861,35 +999,26 @@ def scramble_cube(moves=None):
     ui_state['celebration']['active'] = False
     ui_state['solution_moves'] = []
     ui_state['show_solution'] = False
+    cancel_solve()
 
     if moves is None:
-        moves = get_scramble_length()
-
-    faces = ['U', 'D', 'L', 'R', 'F', 'B']
-    modifiers = ['', "'", "2"]
-
-    scramble = []  # Initialize scramble list
-    last_face = None
-
-    for _ in range(moves):
-        # Avoid same face twice in a row
-        available_faces = [f for f in faces if f != last_face]
-        face = random.choice(available_faces)
-        modifier = random.choice(modifiers)
+        # Hard takes a ready-made random-state scramble from the background pool
+        scramble = cube_scramble.take_scramble(cube_config['size'], get_scramble_length(), current_difficulty == 'Hard')
+    else:
+        scramble = cube_scramble.random_move_scramble(cube_config['size'], moves)
 
-        scramble.append(face + modifier)
-        last_face = face
+    if instant is None:
+        instant = ui_state['instant_scramble']
 
     # Apply scramble
-    for move in scramble:
-        face = move[0]
-        if len(move) > 1:
-            if move[1] == "'":
-                rotate_face(face, clockwise=False)
-            elif move[1] == "2":
-                rotate_face(face, clockwise=True, double=True)
-        else:
-            rotate_face(face, clockwise=True)
+    if instant:
+        # Whole scramble lands in one batch so solving can start on the next frame
+        finish_pending_moves()
+        apply_sequence(scramble)
+    else:
+        for move in scramble:
+            face, clockwise, double, depth = parse_move(move)
+            rotate_face(face, clockwise=clockwise, double=double, depth=depth)
 
     # Clear scrambling flag
     game_state['is_scrambling'] = False
@@ -902,42 +1031,16 @@ def scramble_cube(moves=None):
 #Celebration functions
 def is_cube_solved():
     """Check if the cube is in solved state"""
-    if not cubelets:
+    if cube_state is None:
         return False
 
-    # Define expected colors for each face in solved state
-    expected_faces = {
-        'W': [],  # White (Up)
-        'Y': [],  # Yellow (Down)
-        'R': [],  # Red (Right)
-        'O': [],  # Orange (Left)
-        'B': [],  # Blue (Front)
-        'G': []   # Green (Back)
-    }
-
-    # Collect all stickers by their normals
-    for cubelet in cubelets:
-        for normal, color in cubelet.stickers.items():
-            if normal == (0, 0, 1):   expected_faces['W'].append(color)
-            elif normal == (0, 0, -1): expected_faces['Y'].append(color)
-            elif normal == (1, 0, 0):  expected_faces['R'].append(color)
-            elif normal == (-1, 0, 0): expected_faces['O'].append(color)
-            elif normal == (0, 1, 0):  expected_faces['B'].append(color)
-            elif normal == (0, -1, 0): expected_faces['G'].append(color)
-
-    # Check if each face has uniform color
-    for face_color, stickers in expected_faces.items():
-        if not stickers:  # No stickers on this face
-            continue
-        if not all(color == face_color for color in stickers):
-            return False
-
-    return True
+    # Face color counts are kept up to date by every move, so this is constant time
+    return cube_state.is_solved()
 
 def start_celebration():
     """Start the celebration animation"""
     ui_state['celebration']['active'] = True
-    ui_state['celebration']['start_time'] = time.time()
+    ui_state['celebration']['start_time'] = time.monotonic()
     ui_state['celebration']['message_alpha'] = 0.0
     ui_state['celebration']['cube_spin'] = 0.0
 
@@ -966,12 +1069,12 @@ def start_celebration():
     print(f"Moves: {game_state['move_count']}")
     print(f"Mode: {cube_config['size']}x{cube_config['size']} {current_difficulty}")
 
-def update_celebration():
-    """Update celebration animation"""
+def update_celebration(dt):
+    """Update celebration animation by dt seconds"""
     if not ui_state['celebration']['active']:
         return
 
-    current_time = time.time()
+    current_time = time.monotonic()
     elapsed = current_time - ui_state['celebration']['start_time']
     progress = elapsed / ui_state['celebration']['duration']
 
@@ -987,7 +1090,7 @@ def update_celebration():
         ui_state['celebration']['message_alpha'] = 1.0
 
     # Update cube spin
-    ui_state['celebration']['cube_spin'] += 2.0
+    ui_state['celebration']['cube_spin'] += CELEBRATION_SPIN_SPEED * dt
 
     # Timer blink effect (blinks every 0.3 seconds)
     ui_state['celebration']['timer_blink'] = (int(elapsed * 3) % 2) == 0
@@ -996,28 +1099,20 @@ def draw_celebration_message():
     """Draw congratulations message"""
     alpha = ui_state['celebration']['message_alpha']
 
-    glDisable(GL_LIGHTING)
     glEnable(GL_BLEND)
 
     # Draw background
     glColor4f(0.0, 0.0, 0.5, 0.8 * alpha)
 
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    gluOrtho2D(0, window_width, 0, window_height)
-
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-
     # Background rectangle
+    glDisable(GL_TEXTURE_2D)
     glBegin(GL_QUADS)
     glVertex2f(window_width//6, window_height//4)
     glVertex2f(5*window_width//6, window_height//4)
     glVertex2f(5*window_width//6, 3*window_height//4)
     glVertex2f(window_width//6, 3*window_height//4)
     glEnd()
+    glEnable(GL_TEXTURE_2D)
 
     center_y = window_height // 2
 
@@ -1047,13 +1142,7 @@ def draw_celebration_message():
     glColor4f(0.9, 0.9, 0.9, alpha * 0.8)
     draw_text_centered("Press SPACE to reset", center_y - 80)
 
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-
     glDisable(GL_BLEND)
-    glEnable(GL_LIGHTING)
 
 
 #Helper functions
@@ -1067,6 +1156,12 @@ def get_scramble_length():
     cube_size = cube_config['size']
     return DIFFICULTY_LEVELS[cube_size][current_difficulty]
 
+def get_scramble_label(cube_size, difficulty):
+    """Describe a mode's scramble: its move count, or a random state for Hard on sizes that get one"""
+    if difficulty == 'Hard' and cube_scramble.has_random_state(cube_size):
+        return f"random state, ~{cube_scramble.RANDOM_STATE_LENGTHS[cube_size]} moves"
+    return f"{DIFFICULTY_LEVELS[cube_size][difficulty]} moves"
+
 def record_solve_time(solve_time):
     """Record solve time and update best time"""
     key = get_current_mode_key()
@@ -1094,9 +1189,7 @@ def draw_text_centered(text, y):
     text_width = len(text) * 7
     x = (window_width - text_width) // 2
 
-    glRasterPos2f(x, y)
-    for char in text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
+    draw_string(x, y, text, GLUT_BITMAP_HELVETICA_18)
 #Functions to handle solution tracker
 def enable_solution_tracking():
     """Enable move validation against solution"""
@@ -1177,10 +1270,10 @@ def validate_user_move(move):
         correction_count = 0
 
         if move.endswith("'"):  # If wrong move was prime
-            correction_move = move[0]  # Need normal move
+            correction_move = get_move_base(move)  # Need normal move
             correction_count = 1
-        elif move.endswith("2"):  # If wrong move was double
-            correction_move = move[0]  # Need two normal moves
+        elif move != get_move_base(move):  # If wrong move was double
+            correction_move = get_move_base(move)  # Need two normal moves
             correction_count = 2
         else:  # If wrong move was normal
             correction_move = move + "'"  # Need prime move
@@ -1203,33 +1296,130 @@ def update_move_feedback():
         if elapsed >= solution_tracking['move_feedback']['duration']:
             solution_tracking['move_feedback']['color'] = 'white'
 
-def commit_face_rotation(face, clockwise=True):
+def commit_face_rotation(face, clockwise=True, double=False, depth=1):
     """Apply face rotation to cube state"""
-    face_cubelets = get_face_cubelets(face)
-    axis = get_face_axis(face)
+    cube_state.apply_move(format_move(face, clockwise, double, depth))
+    game_state['state_hash'] = cube_state.hash
+
+    check_for_solve()
+
+def apply_sequence(moves):
+    """Apply a whole move sequence to the cube state in one batch, without animation"""
+    if not moves:
+        return
+
+    cube_state.apply_sequence(moves)
+    game_state['move_history'].extend(moves)
+    game_state['state_hash'] = cube_state.hash
+    ui_state['last_move'] = moves[-1]
+
+    check_for_solve()
+
+def finish_pending_moves():
+    """Commit the running animation and every queued move immediately"""
+    global current_animation
 
-    # Rotate positions
-    for cubelet in face_cubelets:
-        cubelet.pos = rotate_position(cubelet.pos, axis, clockwise)
-        cubelet.rotate_stickers(axis, clockwise)
+    if current_animation is not None:
+        commit_face_rotation(current_animation['face'], current_animation['clockwise'],
+                             double=current_animation['target_angle'] == 180, depth=current_animation['depth'])
+        current_animation = None
+
+    while move_queue:
+        move = move_queue.pop(0)
+        commit_face_rotation(move['face'], move['clockwise'], double=move['angle'] == 180, depth=move['depth'])
 
+def check_for_solve():
+    """Start the celebration if the last move solved a scrambled cube"""
     if (is_cube_solved() and
         game_state['scrambled'] and
         not ui_state['celebration']['active'] and
         game_state['move_count'] > 0):
         start_celebration()
 
-def update_animation():
-    """Update current animation"""
+#Redraw scheduling
+# Nothing runs while the window is idle. Input handlers post a redisplay, and
+# each frame schedules the next update with glutTimerFunc only if something
+# is still moving: every frame during turns and the celebration, at
+# HUD_REFRESH_RATE while the timer runs or a solve is on its way.
+#
+# Each update runs the game logic in fixed SIMULATION_RATE steps up to the
+# current monotonic time, so turns take the same time however fast frames
+# come. Time that passes while nothing moves is skipped, not caught up on.
+loop_state = {
+    'generation': 0,    # id of the newest scheduled update, older timers are ignored
+    'due': None,        # time the scheduled update fires, None when none is pending
+    'clock': 0.0,       # time the game logic has been stepped up to
+    'moving': False,    # whether something is moving, set when motion starts and after every update
+}
+
+def is_moving():
+    """Check if a turn or the celebration needs game logic steps"""
+    if ui_state['show_menu']:
+        return False
+    return current_animation is not None or bool(move_queue) or ui_state['celebration']['active']
+
+def get_update_interval():
+    """Get the seconds until the next update is needed, or None when nothing changes by itself"""
+    if ui_state['show_menu']:
+        return None
+    if is_moving():
+        return 1.0 / FRAME_RATE
+    if (game_state['timer_running'] or ui_state['solve_job'] is not None or
+            solution_tracking['move_feedback']['color'] != 'white'):
+        return 1.0 / HUD_REFRESH_RATE
+    return None
+
+def schedule_update():
+    """Make sure an update is scheduled soon enough for whatever is changing"""
+    interval = get_update_interval()
+    if interval is None:
+        return
+    now = time.monotonic()
+
+    # Motion starts now, so the first logic step can't cover time from before it
+    if not loop_state['moving'] and is_moving():
+        loop_state['moving'] = True
+        loop_state['clock'] = now
+
+    if loop_state['due'] is not None and loop_state['due'] <= now + interval:
+        return
+
+    # GLUT timers can't be cancelled, a sooner one supersedes the pending one
+    loop_state['generation'] += 1
+    loop_state['due'] = now + interval
+    glutTimerFunc(int(interval * 1000), run_update, loop_state['generation'])
+
+def run_update(generation):
+    """Timer callback: advance the game if this is the newest scheduled update"""
+    if generation != loop_state['generation']:
+        return
+    loop_state['due'] = None
+    now = time.monotonic()
+
+    # Nothing is moving, so there is nothing to catch up on
+    if not loop_state['moving']:
+        loop_state['clock'] = now
+    loop_state['clock'] = max(loop_state['clock'], now - MAX_CATCH_UP)
+
+    step = 1.0 / SIMULATION_RATE
+    while loop_state['clock'] + step <= now:
+        update_animation(step)
+        loop_state['clock'] += step
+    loop_state['moving'] = is_moving()
+
+    update_move_feedback()
+    poll_solver()
+    glutPostRedisplay()
+
+def update_animation(dt):
+    """Advance the current turn and the celebration by dt seconds"""
     global current_animation, move_queue
 
     # Don't animate if menu is showing
     if ui_state['show_menu']:
-        glutPostRedisplay()
         return
 
-    update_celebration()
-    update_move_feedback()
+    update_celebration(dt)
 
     # Start new animation if queue not empty and not currently animating
     if current_animation is None and move_queue:
@@ -1238,6 +1428,7 @@ def update_animation():
             'face': move['face'],
             'clockwise': move['clockwise'],
             'target_angle': move['angle'],
+            'depth': move['depth'],
             'current_angle': 0
         }
 
@@ -1245,22 +1436,17 @@ def update_animation():
 
     # Update current animation
     if current_animation is not None:
-        current_animation['current_angle'] += ui_state['animation_speed']
+        current_animation['current_angle'] += ui_state['animation_speed'] * dt
 
         # Animation completed
         if current_animation['current_angle'] >= current_animation['target_angle']:
             # Commit the move
-            if current_animation['target_angle'] == 180:
-                # Double move - apply twice
-                commit_face_rotation(current_animation['face'], current_animation['clockwise'])
-                commit_face_rotation(current_animation['face'], current_animation['clockwise'])
-            else:
-                commit_face_rotation(current_animation['face'], current_animation['clockwise'])
+            # Double moves have their own permutation, so they commit in one step
+            commit_face_rotation(current_animation['face'], current_animation['clockwise'],
+                                 double=current_animation['target_angle'] == 180, depth=current_animation['depth'])
 
             current_animation = None
 
-    glutPostRedisplay()
-
 def mouse_handler(button, state, x, y):
     """Handle mouse input"""
     global mouse_state
@@ -1316,8 +1502,7 @@ def keyboard_handler(key, x, y):
                 glutPostRedisplay()
             else:  # difficulty stage
                 # Confirm selection and start game
-                cube_sizes = [2, 3, 4]
-                selected_cube_size = cube_sizes[ui_state['menu_selection']]
+                selected_cube_size = CUBE_SIZES[ui_state['menu_selection']]
                 difficulties = ['Easy', 'Medium', 'Hard']
                 global current_difficulty
                 current_difficulty = difficulties[ui_state['difficulty_selection']]
@@ -1337,11 +1522,16 @@ def keyboard_handler(key, x, y):
                 game_state['solved_by_moves'] = False
                 game_state['final_time'] = 0
                 ui_state['last_move'] = None
+                ui_state['layer_depth'] = 1
                 ui_state['celebration']['active'] = False
                 ui_state['solution_moves'] = []
                 ui_state['show_solution'] = False
                 move_queue.clear()
 
+                # Random-state scrambles for Hard start cooking in the background right away
+                if current_difficulty == 'Hard':
+                    cube_scramble.refill(cube_config['size'], get_scramble_length())
+
                 print(f"{cube_config['size']}x{cube_config['size']} cube selected with {current_difficulty} difficulty!")
                 glutPostRedisplay()
             return
@@ -1373,6 +1563,13 @@ def keyboard_handler(key, x, y):
             # Normal move
             rotate_face(key_char, clockwise=True)
 
+    # Inner layer selection for bigger cubes
+    elif key_char in '[]' and game_state['cube_selected']:
+        double_move_pending = False  # Reset double move state
+        step = 1 if key_char == ']' else -1
+        ui_state['layer_depth'] = max(1, min(get_max_depth(cube_config['size']), ui_state['layer_depth'] + step))
+        print(f"Layer: {ui_state['layer_depth']}")
+
     # Double moves (press 2 then face key)
     elif key_char == '2':
         double_move_pending = True
@@ -1383,6 +1580,12 @@ def keyboard_handler(key, x, y):
         double_move_pending = False  # Reset double move state
         scramble_cube()
 
+    # Toggle instant scramble
+    elif key_char == 'I':
+        double_move_pending = False  # Reset double move state
+        ui_state['instant_scramble'] = not ui_state['instant_scramble']
+        print(f"Instant scramble: {'on' if ui_state['instant_scramble'] else 'off'}")
+
     # Reset
     elif key == b' ' and game_state['cube_selected']:
         double_move_pending = False  # Reset double move state
@@ -1398,6 +1601,7 @@ def keyboard_handler(key, x, y):
 
         ui_state['solution_moves'] = []
         ui_state['show_solution'] = False
+        cancel_solve()
         move_queue.clear()
         print(f"{cube_config['size']}x{cube_config['size']} cube reset!")
 
@@ -1422,17 +1626,18 @@ def keyboard_handler(key, x, y):
         ui_state['menu_stage'] = 'cube_size'
         game_state['cube_selected'] = False
         ui_state['show_help'] = False
+        cancel_solve()
         print("Returned to menu")
 
     # Speed control
     elif key_char == '+':
         double_move_pending = False  # Reset double move state
-        ui_state['animation_speed'] = min(20, ui_state['animation_speed'] + 1)
-        print(f"Animation speed: {ui_state['animation_speed']}")
+        ui_state['animation_speed'] = min(1200, ui_state['animation_speed'] + 60)
+        print(f"Animation speed: {ui_state['animation_speed']:.0f} degrees/s")
     elif key_char == '-':
         double_move_pending = False  # Reset double move state
-        ui_state['animation_speed'] = max(1, ui_state['animation_speed'] - 1)
-        print(f"Animation speed: {ui_state['animation_speed']}")
+        ui_state['animation_speed'] = max(60, ui_state['animation_speed'] - 60)
+        print(f"Animation speed: {ui_state['animation_speed']:.0f} degrees/s")
 
     # Show solution
     elif key_char == 'V' and game_state['cube_selected']:  # 'V' for View solution
@@ -1442,6 +1647,8 @@ def keyboard_handler(key, x, y):
     # Hide solution
     elif key_char == 'C' and game_state['cube_selected']:  # 'C' to Clear solution display
         double_move_pending = False  # Reset double move state
+        if cancel_solve():
+            print("Solve cancelled")
         ui_state['show_solution'] = False
         ui_state['solution_moves'] = []
         print("Solution hidden")
@@ -1458,6 +1665,8 @@ def keyboard_handler(key, x, y):
     else:
         double_move_pending = False
 
+    glutPostRedisplay()
+
 def special_keys_handler(key, x, y):
     """Handle special keys (arrows, etc.) with 4x4 support"""
     if ui_state['show_menu']:
@@ -1466,7 +1675,7 @@ def special_keys_handler(key, x, y):
                 ui_state['menu_selection'] = max(0, ui_state['menu_selection'] - 1)
                 glutPostRedisplay()
             elif key == GLUT_KEY_DOWN:
-                ui_state['menu_selection'] = min(2, ui_state['menu_selection'] + 1)  # Now 0, 1, 2 for 2x2, 3x3, 4x4
+                ui_state['menu_selection'] = min(len(CUBE_SIZES) - 1, ui_state['menu_selection'] + 1)
                 glutPostRedisplay()
 
         elif ui_state['menu_stage'] == 'difficulty':
@@ -1484,10 +1693,7 @@ def handle_enter_key():
     """Handle Enter key press for menu selection"""
     if ui_state['show_menu']:
         # Confirm selection
-        if ui_state['menu_selection'] == 0:
-            setup_cube_size(2)
-        else:
-            setup_cube_size(3)
+        setup_cube_size(CUBE_SIZES[ui_state['menu_selection']])
 
         init_cube()
         ui_state['show_menu'] = False
@@ -1510,22 +1716,32 @@ def display():
     glLoadIdentity()
 
     if ui_state['show_menu']:
+        begin_overlay()
         draw_menu()
+        end_overlay()
     else:
         setup_camera()
         setup_lighting()
 
         if ui_state['celebration']['active']:
           glRotatef(ui_state['celebration']['cube_spin'], 0, 1, 1)
+
+        # Big cubes are scaled down to fit the view
+        scale = get_cube_scale()
+        glScalef(scale, scale, scale)
         # Draw cube
         draw_animated_cube()
 
+        # HUD in one 2D pass
+        begin_overlay()
         if ui_state['celebration']['active']:
             draw_celebration_message()
         # Draw UI
         draw_ui()
+        end_overlay()
 
     glutSwapBuffers()
+    schedule_update()
 
 def init_opengl():
     """Initialize OpenGL settings"""
@@ -1549,8 +1765,21 @@ def init_opengl():
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
+def load_opengl():
+    """Import PyOpenGL into this module, only done once a window is about to be created"""
+    from OpenGL import GL, GLU, GLUT
+
+    # Same names a star import would bring in, without shadowing our own globals
+    module_globals = globals()
+    for module in (GL, GLUT, GLU):
+        for name in dir(module):
+            if not name.startswith('_') and name not in module_globals:
+                module_globals[name] = getattr(module, name)
+
 def main():
     """Main function"""
+    load_opengl()
+
     # Initialize GLUT
     glutInit()
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
@@ -1567,7 +1796,6 @@ def main():
     glutSpecialFunc(special_keys_handler)
     glutMouseFunc(mouse_handler)
     glutMotionFunc(mouse_motion)
-    glutIdleFunc(update_animation)
 
     print("3D Rubik's Cube Simulator")
     print("Use UP/DOWN arrows to select cube size, then press ENTER")
@@ -0,0 +1,141 @@
+"""Optimal 2x2 solver from a memory-mapped distance table
+
+The DBL corner is the fixed reference (see cube_encoding), so U, R and F
+turns reach every state. A breadth-first search over all 3,674,160 states
+stores each state's distance to solved in one byte. Solving walks downhill
+through that table one move at a time, which gives an optimal solution
+(at most 11 moves) with a few dozen table lookups.
+"""
+from cube_core import FaceletCube, get_move_table
+from cube_encoding import (CORNERS, TWO_BY_TWO_STATES, encode_2x2, get_corners, orientation_rank,
+                           orientation_unrank, permutation_rank, permutation_unrank)
+from cube_tables import load_rows, map_table
+
+MOVES = ['U', "U'", 'U2', 'R', "R'", 'R2', 'F', "F'", 'F2']
+DISTANCE_TABLE = 'distance_2x2.bin'
+UNVISITED = 255
+
+DBL = CORNERS.index('DBL')
+
+def get_corner_moves():
+    """Get each move as corner pieces: slot i takes the piece from slot cp[i], twisted by co[i]"""
+    table = get_move_table(2)
+    moves = []
+    for move in MOVES:
+        cube = FaceletCube(2)
+        cube.apply_permutation(table['perms'][move])
+        moves.append(get_corners(cube.facelets, 2))
+    return moves
+
+def build_permutation_moves(start=0, stop=5040):
+    """Build the move table for the permutation of the seven free corners (rows start..stop-1)"""
+    result = []
+    corner_moves = get_corner_moves()
+    for rank in range(start, stop):
+        pieces = [piece + (piece >= DBL) for piece in permutation_unrank(rank, 7)]
+        cp = pieces[:DBL] + [DBL] + pieces[DBL:]
+        for move_cp, _ in corner_moves:
+            moved = [cp[source] for source in move_cp]
+            result.append(permutation_rank([piece - (piece > DBL) for slot, piece in enumerate(moved) if slot != DBL]))
+    return result
+
+def build_orientation_moves(start=0, stop=729):
+    """Build the move table for the twists of the seven free corners (rows start..stop-1)"""
+    result = []
+    corner_moves = get_corner_moves()
+    for rank in range(start, stop):
+        twists = orientation_unrank(rank, 3, 7)
+        co = twists[:DBL] + [0] + twists[DBL:]
+        for move_cp, move_co in corner_moves:
+            moved = [(co[source] + twist) % 3 for source, twist in zip(move_cp, move_co)]
+            result.append(orientation_rank(moved[:DBL] + moved[DBL + 1:], 3))
+    return result
+
+# Row tables, built in parallel chunks by build_tables.py
+PERM_MOVES = {'name': 'perm_moves_2x2.bin', 'typecode': 'H', 'rows': 5040, 'width': len(MOVES),
+              'build': build_permutation_moves}
+TWIST_MOVES = {'name': 'twist_moves_2x2.bin', 'typecode': 'H', 'rows': 729, 'width': len(MOVES),
+               'build': build_orientation_moves}
+
+def get_permutation_moves():
+    return load_rows(PERM_MOVES)
+
+def get_orientation_moves():
+    return load_rows(TWIST_MOVES)
+
+def build_distance_table():
+    """Breadth-first search from solved over every state, one byte of distance per state"""
+    import numpy as np
+
+    perm_moves = np.array(get_permutation_moves(), dtype=np.int32).reshape(5040, len(MOVES))
+    twist_moves = np.array(get_orientation_moves(), dtype=np.int32).reshape(729, len(MOVES))
+
+    distance = np.full(TWO_BY_TWO_STATES, UNVISITED, dtype=np.uint8)
+    distance[0] = 0
+    frontier = np.array([0], dtype=np.int32)
+    depth = 0
+    while len(frontier):
+        perm, twist = np.divmod(frontier, 729)
+        for move in range(len(MOVES)):
+            states = perm_moves[perm, move] * 729 + twist_moves[twist, move]
+            distance[states[distance[states] == UNVISITED]] = depth + 1
+        depth += 1
+        frontier = np.flatnonzero(distance == depth).astype(np.int32)
+
+    return distance.tobytes()
+
+def get_distance_table():
+    """Get the memory-mapped distance table, building it on first use"""
+    return map_table(DISTANCE_TABLE, TWO_BY_TWO_STATES, build_distance_table)
+
+def solve(cube, time_budget=None, on_solution=None, stop=None):
+    """Get an optimal solution (list of moves) for a 2x2 cube, no time budget needed
+
+    The first solution is already optimal, so on_solution (if given) is called once with it.
+    The table walk takes microseconds, so stop is never checked.
+    """
+    distance = get_distance_table()
+    perm_moves = get_permutation_moves()
+    twist_moves = get_orientation_moves()
+
+    perm, twist = divmod(encode_2x2(cube), 729)
+    solution = []
+    remaining = distance[perm * 729 + twist]
+    while remaining:
+        # Some move always leads one step closer, take the first one found
+        for move in range(len(MOVES)):
+            next_perm = perm_moves[perm * len(MOVES) + move]
+            next_twist = twist_moves[twist * len(MOVES) + move]
+            if distance[next_perm * 729 + next_twist] < remaining:
+                break
+        solution.append(MOVES[move])
+        perm, twist = next_perm, next_twist
+        remaining -= 1
+    if on_solution is not None:
+        on_solution(solution)
+    return solution
+
+def main():
+    """Build the distance table, or solve a scramble given on the command line"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Optimal 2x2 solver")
+    parser.add_argument('--build', action='store_true', help="build the distance table and exit")
+    parser.add_argument('scramble', nargs='*', help="scramble moves, e.g. R U F' U2")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_distance_table()
+    print(f"Distance table ready in {time.perf_counter() - start:.2f}s")
+    if args.build:
+        return
+
+    cube = FaceletCube(2)
+    cube.apply_sequence(args.scramble)
+    start = time.perf_counter()
+    solution = solve(cube)
+    print(f"Solution ({len(solution)} moves, {(time.perf_counter() - start) * 1e6:.0f} us): {' '.join(solution)}")
+
+if __name__ == "__main__":
+    main()
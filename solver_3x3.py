@@ -0,0 +1,484 @@
+"""Two-phase (Kociemba) 3x3 solver
+
+Phase 1 brings the cube into the subgroup <U, D, R2, L2, F2, B2>: no corner
+is twisted, no edge is flipped and the four E-slice edges (FR, FL, BL, BR)
+are back in the slice. Phase 2 solves the rest with those moves only.
+Both phases are IDA* searches over small coordinates, driven by move tables
+and pruning tables that are built once, saved in tables/ and memory-mapped
+on later runs.
+
+After the first solution, phase 1 keeps trying longer subgroup entries while
+the time budget lasts. Each try may give a shorter total, so solutions end
+up around 20-22 moves.
+
+solve_optimal runs a plain IDA* over the same tables instead, split across
+processes by cube_search. It is only practical for shallow scrambles.
+"""
+import itertools
+import time
+from math import comb
+
+import cube_search
+from cube_core import FaceletCube, get_move_table
+from cube_encoding import (canonical_facelets, get_corners, get_edges, orientation_rank, orientation_unrank,
+                           permutation_rank)
+from cube_tables import load_array, load_rows, map_layers
+
+# Opposite faces sit three apart, so face // 3 tells which half of an axis pair comes first
+MOVE_FACES = ['U', 'R', 'F', 'D', 'L', 'B']
+MOVES = [face + modifier for face in MOVE_FACES for modifier in ('', "'", '2')]
+PHASE2_MOVES = [MOVES.index(move) for move in ('U', "U'", 'U2', 'D', "D'", 'D2', 'R2', 'L2', 'F2', 'B2')]
+
+TWISTS = 2187         # 3^7 corner orientations
+FLIPS = 2048          # 2^11 edge orientations
+SLICES = 495          # 12C4 places for the slice edges
+SLICE_PERMS = 24      # 4! orders of the slice edges
+PERMS_8 = 40320       # 8! corner permutations, and U/D edge permutations in phase 2
+
+SOLVED_SLICE = 494    # slice coordinate with the slice edges in slots 8-11
+
+SOLVE_TIME_BUDGET = 1.0  # seconds spent looking for shorter solutions
+TARGET_LENGTH = 20       # stop early once a solution this short is found
+PHASE2_LIMIT = 12        # longest phase 2 tried before phase 1 looks further, deep phase 2 searches are slow
+
+cubie_moves = []  # (cp, co, ep, eo) per move, filled on first use
+
+#Cubie level
+def get_cubie_moves():
+    """Get every move as pieces: slot i takes the piece from slot cp[i]/ep[i], turned by co[i]/eo[i]"""
+    if not cubie_moves:
+        table = get_move_table(3)
+        for move in MOVES:
+            cube = FaceletCube(3)
+            cube.apply_permutation(table['perms'][move])
+            cubie_moves.append(get_corners(cube.facelets, 3) + get_edges(cube.facelets, 3))
+    return cubie_moves
+
+def slice_coordinate(ep):
+    """Rank where the slice edges (pieces 8-11) sit and in which order, 0..11879"""
+    slots = [slot for slot, piece in enumerate(ep) if piece >= 8]
+    places = sum(comb(slot, k + 1) for k, slot in enumerate(slots))
+    return places * SLICE_PERMS + permutation_rank([ep[slot] - 8 for slot in slots])
+
+#Move tables
+def rank_permutations(rows):
+    """Rank every row of a 2D NumPy array of permutations, matching cube_encoding.permutation_rank"""
+    import numpy as np
+
+    n = rows.shape[1]
+    rank = np.zeros(len(rows), dtype=np.int64)
+    for i in range(n):
+        smaller = (rows[:, i + 1:] < rows[:, i:i + 1]).sum(axis=1)
+        rank = rank * (n - i) + smaller
+    return rank
+
+def build_permutation_moves(sources):
+    """Build a move table for a permutation of 8 pieces, one column per move given as slot sources"""
+    import numpy as np
+
+    # itertools yields permutations in rank order, so row r is the permutation of rank r
+    perms = np.array(list(itertools.permutations(range(8))), dtype=np.int8)
+    columns = [rank_permutations(perms[:, source]) for source in sources]
+    return np.stack(columns, axis=1).astype(np.uint16).ravel()
+
+def build_twist_moves(start=0, stop=TWISTS):
+    """Build the corner orientation move table (rows start..stop-1)"""
+    result = []
+    for rank in range(start, stop):
+        co = orientation_unrank(rank, 3, 8)
+        for cp_move, co_move, _, _ in get_cubie_moves():
+            result.append(orientation_rank([(co[source] + twist) % 3 for source, twist in zip(cp_move, co_move)], 3))
+    return result
+
+def build_flip_moves(start=0, stop=FLIPS):
+    """Build the edge orientation move table (rows start..stop-1)"""
+    result = []
+    for rank in range(start, stop):
+        eo = orientation_unrank(rank, 2, 12)
+        for _, _, ep_move, eo_move in get_cubie_moves():
+            result.append(orientation_rank([eo[source] ^ flip for source, flip in zip(ep_move, eo_move)], 2))
+    return result
+
+def build_slice_moves():
+    """Build the slice edge move table, indexed by slice_coordinate"""
+    result = [0] * (SLICES * SLICE_PERMS * len(MOVES))
+    for slots in itertools.combinations(range(12), 4):
+        for order in itertools.permutations(range(8, 12)):
+            # Only the slice edges matter, the other slots get placeholder pieces
+            ep = [-1] * 12
+            for slot, piece in zip(slots, order):
+                ep[slot] = piece
+            coord = slice_coordinate(ep)
+            for move, (_, _, ep_move, _) in enumerate(get_cubie_moves()):
+                result[coord * len(MOVES) + move] = slice_coordinate([ep[source] for source in ep_move])
+    return result
+
+def build_corner_moves():
+    return build_permutation_moves([cp_move for cp_move, _, _, _ in get_cubie_moves()])
+
+def build_edge_moves():
+    # Phase 2 moves never take U/D edges out of slots 0-7
+    return build_permutation_moves([get_cubie_moves()[move][2][:8] for move in PHASE2_MOVES])
+
+# Row tables, built in parallel chunks by build_tables.py
+TWIST_MOVES = {'name': 'twist_moves_3x3.bin', 'typecode': 'H', 'rows': TWISTS, 'width': len(MOVES),
+               'build': build_twist_moves}
+FLIP_MOVES = {'name': 'flip_moves_3x3.bin', 'typecode': 'H', 'rows': FLIPS, 'width': len(MOVES),
+              'build': build_flip_moves}
+
+def get_move_tables():
+    """Get all coordinate move tables, building them on first use"""
+    return {
+        'twist': load_rows(TWIST_MOVES),
+        'flip': load_rows(FLIP_MOVES),
+        'slice': load_array('slice_moves_3x3.bin', 'H', SLICES * SLICE_PERMS * len(MOVES), build_slice_moves),
+        'corner': load_array('corner_moves_3x3.bin', 'H', PERMS_8 * len(MOVES), build_corner_moves),
+        'edge': load_array('edge_moves_3x3.bin', 'H', PERMS_8 * len(PHASE2_MOVES), build_edge_moves),
+    }
+
+#Pruning tables
+def get_phase1_move_arrays():
+    """Get the phase 1 move tables as NumPy arrays: twist, flip, and slice places only"""
+    import numpy as np
+
+    tables = get_move_tables()
+    slices = np.array(tables['slice'], dtype=np.int64).reshape(SLICES, SLICE_PERMS, len(MOVES))[:, 0] // SLICE_PERMS
+    return (np.array(tables['twist']).reshape(TWISTS, len(MOVES)),
+            np.array(tables['flip']).reshape(FLIPS, len(MOVES)),
+            slices)
+
+def get_phase2_move_arrays():
+    """Get the phase 2 move tables as NumPy arrays: corners, U/D edges and slice order"""
+    import numpy as np
+
+    tables = get_move_tables()
+    corners = np.array(tables['corner']).reshape(PERMS_8, len(MOVES))[:, PHASE2_MOVES]
+    edges = np.array(tables['edge']).reshape(PERMS_8, len(PHASE2_MOVES))
+    return corners, edges, np.array(get_slice_order_moves()).reshape(SLICE_PERMS, len(PHASE2_MOVES))
+
+def get_twist_slice_moves():
+    twist, _, slices = get_phase1_move_arrays()
+    return twist, slices
+
+def get_flip_slice_moves():
+    _, flip, slices = get_phase1_move_arrays()
+    return flip, slices
+
+def get_corner_slice_moves():
+    corners, _, order = get_phase2_move_arrays()
+    return corners, order
+
+def get_edge_slice_moves():
+    _, edges, order = get_phase2_move_arrays()
+    return edges, order
+
+def get_corner_only_moves():
+    import numpy as np
+
+    corners = np.array(get_move_tables()['corner']).reshape(PERMS_8, len(MOVES))
+    return corners, np.zeros((1, len(MOVES)), dtype=np.int64)
+
+# Breadth-first tables, built depth by depth in parallel chunks by build_tables.py
+TWIST_SLICE_PRUNE = {'name': 'twist_slice_prune_3x3.bin', 'length': TWISTS * SLICES, 'goal': SOLVED_SLICE,
+                     'moves': get_twist_slice_moves}
+FLIP_SLICE_PRUNE = {'name': 'flip_slice_prune_3x3.bin', 'length': FLIPS * SLICES, 'goal': SOLVED_SLICE,
+                    'moves': get_flip_slice_moves}
+CORNER_SLICE_PRUNE = {'name': 'corner_slice_prune_3x3.bin', 'length': PERMS_8 * SLICE_PERMS, 'goal': 0,
+                      'moves': get_corner_slice_moves}
+EDGE_SLICE_PRUNE = {'name': 'edge_slice_prune_3x3.bin', 'length': PERMS_8 * SLICE_PERMS, 'goal': 0,
+                    'moves': get_edge_slice_moves}
+CORNER_PRUNE = {'name': 'corner_prune_3x3.bin', 'length': PERMS_8, 'goal': 0, 'moves': get_corner_only_moves}
+PRUNING_TABLES = [TWIST_SLICE_PRUNE, FLIP_SLICE_PRUNE, CORNER_SLICE_PRUNE, EDGE_SLICE_PRUNE, CORNER_PRUNE]
+
+def get_pruning_tables():
+    """Get the memory-mapped pruning tables, building them on first use"""
+    return {
+        'twist_slice': map_layers(TWIST_SLICE_PRUNE),
+        'flip_slice': map_layers(FLIP_SLICE_PRUNE),
+        'corner_slice': map_layers(CORNER_SLICE_PRUNE),
+        'edge_slice': map_layers(EDGE_SLICE_PRUNE),
+        'corner': map_layers(CORNER_PRUNE),
+    }
+
+def get_slice_order_moves():
+    """Get the phase 2 move table for the order of the slice edges (they stay in the slice)"""
+    slice_moves = get_move_tables()['slice']
+    base = SOLVED_SLICE * SLICE_PERMS
+    return [slice_moves[(base + order) * len(MOVES) + move] - base
+            for order in range(SLICE_PERMS) for move in PHASE2_MOVES]
+
+def build_tables():
+    """Build every table that is still missing"""
+    get_move_tables()
+    get_pruning_tables()
+
+def get_start_state(cube):
+    """Get (twist, flip, slice, corners, edge permutation) with colors named after the centers"""
+    facelets = canonical_facelets(cube)
+    cp, co = get_corners(facelets, 3)
+    ep, eo = get_edges(facelets, 3)
+    return orientation_rank(co, 3), orientation_rank(eo, 2), slice_coordinate(ep), permutation_rank(cp), tuple(ep)
+
+#Search
+class SearchDone(Exception):
+    """Raised to unwind the search once the time budget is spent, the target is reached or a stop is asked"""
+
+class TwoPhaseSearch:
+    def __init__(self, cube, time_budget, target_length, on_solution=None, stop=None):
+        moves = get_move_tables()
+        self.twist_moves = moves['twist']
+        self.flip_moves = moves['flip']
+        self.slice_moves = moves['slice']
+        self.corner_moves = moves['corner']
+        self.edge_moves = moves['edge']
+        self.order_moves = get_slice_order_moves()
+        self.edge_sources = [ep_move for _, _, ep_move, _ in get_cubie_moves()]
+
+        prune = get_pruning_tables()
+        self.twist_slice = prune['twist_slice']
+        self.flip_slice = prune['flip_slice']
+        self.corner_slice = prune['corner_slice']
+        self.edge_slice = prune['edge_slice']
+
+        self.twist, self.flip, self.slice, self.corners, ep = get_start_state(cube)
+        self.ep = list(ep)
+
+        self.deadline = time.perf_counter() + time_budget
+        self.target_length = target_length
+        self.on_solution = on_solution
+        self.stop = stop
+        self.entries = 0  # phase 2 starts, the stop flag is checked every 64th
+        self.path = []
+        self.phase2_path = []
+        self.best = None
+
+    def run(self):
+        """Search with longer and longer phase 1 lengths until the budget or the best length stops it"""
+        slice_places = self.slice // SLICE_PERMS
+        depth = max(self.twist_slice[self.twist * SLICES + slice_places],
+                    self.flip_slice[self.flip * SLICES + slice_places])
+        try:
+            while self.best is None or depth < len(self.best):
+                self.phase1(self.twist, self.flip, self.slice, depth, -1)
+                depth += 1
+        except SearchDone:
+            pass
+        return self.best
+
+    def phase1(self, twist, flip, slice_coord, depth, last_face):
+        """Depth-first search for exactly depth moves that end in the phase 2 subgroup"""
+        if depth == 0:
+            # A last move that stays in the subgroup means a shorter entry was already tried
+            if not self.path or self.path[-1] not in PHASE2_MOVES:
+                self.start_phase2()
+            return
+
+        move_count = len(MOVES)
+        for move in range(move_count):
+            face = move // 3
+            if face == last_face or face == last_face - 3:
+                continue
+
+            next_twist = self.twist_moves[twist * move_count + move]
+            next_flip = self.flip_moves[flip * move_count + move]
+            next_slice = self.slice_moves[slice_coord * move_count + move]
+            places = next_slice // SLICE_PERMS
+            if (self.twist_slice[next_twist * SLICES + places] >= depth or
+                    self.flip_slice[next_flip * SLICES + places] >= depth):
+                continue
+
+            self.path.append(move)
+            self.phase1(next_twist, next_flip, next_slice, depth - 1, face)
+            self.path.pop()
+
+    def start_phase2(self):
+        """Solve the rest from the subgroup, only keeping solutions that beat the best so far"""
+        if self.best is not None and time.perf_counter() > self.deadline:
+            raise SearchDone
+        self.entries += 1
+        if self.stop is not None and not self.entries & 63 and self.stop.is_set():
+            raise SearchDone
+
+        # Follow the phase 1 moves on the corner coordinate and the full edge permutation
+        corners, ep = self.corners, self.ep
+        for move in self.path:
+            corners = self.corner_moves[corners * len(MOVES) + move]
+            ep = [ep[source] for source in self.edge_sources[move]]
+
+        edges = permutation_rank(ep[:8])
+        order = permutation_rank([piece - 8 for piece in ep[8:]])
+        depth = max(self.corner_slice[corners * SLICE_PERMS + order], self.edge_slice[edges * SLICE_PERMS + order])
+
+        limit = PHASE2_LIMIT if self.best is None else min(PHASE2_LIMIT, len(self.best) - len(self.path) - 1)
+        last_face = self.path[-1] // 3 if self.path else -1
+        while depth <= limit:
+            if self.phase2(corners, edges, order, depth, last_face):
+                self.best = [MOVES[move] for move in self.path + self.phase2_path]
+                self.phase2_path = []
+                if self.on_solution is not None:
+                    self.on_solution(self.best)
+                if len(self.best) <= self.target_length:
+                    raise SearchDone
+                return
+            depth += 1
+
+    def phase2(self, corners, edges, order, depth, last_face):
+        """Depth-first search for exactly depth subgroup moves that solve the cube"""
+        if depth == 0:
+            return corners == 0 and edges == 0 and order == 0
+
+        move_count = len(PHASE2_MOVES)
+        for index, move in enumerate(PHASE2_MOVES):
+            face = move // 3
+            if face == last_face or face == last_face - 3:
+                continue
+
+            next_corners = self.corner_moves[corners * len(MOVES) + move]
+            next_edges = self.edge_moves[edges * move_count + index]
+            next_order = self.order_moves[order * move_count + index]
+            if (self.corner_slice[next_corners * SLICE_PERMS + next_order] >= depth or
+                    self.edge_slice[next_edges * SLICE_PERMS + next_order] >= depth):
+                continue
+
+            self.phase2_path.append(move)
+            if self.phase2(next_corners, next_edges, next_order, depth - 1, face):
+                return True
+            self.phase2_path.pop()
+        return False
+
+def solve(cube, time_budget=SOLVE_TIME_BUDGET, on_solution=None, target_length=TARGET_LENGTH, stop=None):
+    """Get a solution (list of moves) for a 3x3 cube, as short as the time budget allows
+
+    on_solution, if given, is called with every shorter solution as soon as it is found.
+    Once stop.is_set() (an Event or anything with that method) the search gives up and
+    returns the best solution so far, None if there is none yet.
+    """
+    return TwoPhaseSearch(cube, time_budget, target_length, on_solution, stop).run()
+
+#Optimal search
+class OptimalSearch:
+    def __init__(self, start, stop=None):
+        moves = get_move_tables()
+        self.twist_moves = moves['twist']
+        self.flip_moves = moves['flip']
+        self.slice_moves = moves['slice']
+        self.corner_moves = moves['corner']
+        self.edge_sources = [ep_move for _, _, ep_move, _ in get_cubie_moves()]
+
+        prune = get_pruning_tables()
+        self.twist_slice = prune['twist_slice']
+        self.flip_slice = prune['flip_slice']
+        self.corner = prune['corner']
+
+        self.start = start
+        self.stop = stop
+        self.nodes = 0
+        self.path = []
+
+    def distance(self, twist, flip, slice_coord, corners):
+        """Lower bound on the moves left: the largest of the three pruning tables"""
+        places = slice_coord // SLICE_PERMS
+        return max(self.twist_slice[twist * SLICES + places], self.flip_slice[flip * SLICES + places],
+                   self.corner[corners])
+
+    def turn(self, twist, flip, slice_coord, corners, move):
+        count = len(MOVES)
+        return (self.twist_moves[twist * count + move], self.flip_moves[flip * count + move],
+                self.slice_moves[slice_coord * count + move], self.corner_moves[corners * count + move])
+
+    def is_solved(self, twist, flip, slice_coord, corners):
+        if twist or flip or corners or slice_coord != SOLVED_SLICE * SLICE_PERMS:
+            return False
+        # The coordinates miss the order of the U/D edges, follow the path to check them
+        ep = self.start[4]
+        for move in self.path:
+            ep = [ep[source] for source in self.edge_sources[move]]
+        return list(ep) == list(range(12))
+
+    def search(self, twist, flip, slice_coord, corners, depth, last_face):
+        """Depth-first search for a solution of exactly depth more moves"""
+        if depth == 0:
+            return self.is_solved(twist, flip, slice_coord, corners)
+
+        self.nodes += 1
+        if self.stop is not None and not self.nodes & 1023 and self.stop.is_set():
+            raise SearchDone
+
+        for move in range(len(MOVES)):
+            face = move // 3
+            if face == last_face or face == last_face - 3:
+                continue
+
+            state = self.turn(twist, flip, slice_coord, corners, move)
+            if self.distance(*state) >= depth:
+                continue
+
+            self.path.append(move)
+            if self.search(*state, depth - 1, face):
+                return True
+            self.path.pop()
+        return False
+
+def lower_bound(start):
+    """First IDA* bound for a start state from get_start_state"""
+    return OptimalSearch(start).distance(*start[:4])
+
+def search_prefixes(start, depth):
+    """Get every move sequence of the given length that the search itself would try"""
+    prefixes = []
+    for prefix in itertools.product(range(len(MOVES)), repeat=depth):
+        faces = [move // 3 for move in prefix]
+        if all(face != last and face != last - 3 for last, face in zip(faces, faces[1:])):
+            prefixes.append(prefix)
+    return prefixes
+
+def search_subtree(start, prefix, bound, stop=None):
+    """Look for a solution of exactly bound moves that starts with prefix"""
+    if stop is not None and stop.is_set():
+        return None
+    search = OptimalSearch(start, stop)
+    state = start[:4]
+    for move in prefix:
+        state = search.turn(*state, move)
+    search.path = list(prefix)
+
+    depth = bound - len(prefix)
+    if depth < 0 or search.distance(*state) > depth:
+        return None
+    try:
+        if search.search(*state, depth, prefix[-1] // 3 if prefix else -1):
+            return [MOVES[move] for move in search.path]
+    except SearchDone:
+        pass
+    return None
+
+def solve_optimal(cube, workers=None, max_depth=20):
+    """Get a shortest solution for a 3x3 cube with a parallel IDA*, fine for scrambles up to ~12 moves"""
+    return cube_search.parallel_search('solver_3x3', get_start_state(cube), max_depth, workers)
+
+def main():
+    """Build the tables, or solve a scramble given on the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Two-phase 3x3 solver")
+    parser.add_argument('--build', action='store_true', help="build the move and pruning tables and exit")
+    parser.add_argument('--time', type=float, default=SOLVE_TIME_BUDGET, help="time budget in seconds")
+    parser.add_argument('--optimal', action='store_true', help="search for a shortest solution instead")
+    parser.add_argument('--workers', type=int, default=None, help="processes for --optimal (default: all cores)")
+    parser.add_argument('scramble', nargs='*', help="scramble moves, e.g. R U F' U2")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build_tables()
+    print(f"Tables ready in {time.perf_counter() - start:.2f}s")
+    if args.build:
+        return
+
+    cube = FaceletCube(3)
+    cube.apply_sequence(args.scramble)
+    start = time.perf_counter()
+    solution = solve_optimal(cube, args.workers) if args.optimal else solve(cube, args.time)
+    print(f"Solution ({len(solution)} moves, {time.perf_counter() - start:.2f}s): {' '.join(solution)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Reduction solver for the 4x4
+
+The 4x4 is reduced to a 3x3 and then handed to the two-phase solver:
+
+    1. Centers, in three table-driven stages: U/D colors onto U/D, R/L colors
+       onto R/L, then every face uniform (in a color scheme the corners allow)
+    2. Edge pairing: every wing goes to its home slot next to its partner,
+       using pure wing 3-cycles (conjugated commutators) from a lookup table
+    3. Parity: an odd wing permutation gets the OLL parity algorithm first, an
+       odd corner permutation gets the PLL parity algorithm before the last stage
+    4. The reduced cube is solved as a 3x3 with outer moves only
+
+Center stages walk downhill through breadth-first distance tables like the
+2x2 solver. Every table is built once, saved in tables/ and memory-mapped.
+Moves include the inner slices (2R, 2U', ...) from cube_core's 4x4 move table.
+"""
+import itertools
+import time
+from math import comb
+
+import solver_3x3
+from cube_core import (FACE_AXES, FACES, FaceletCube, format_move, get_inverse_move, get_layout, get_move_base,
+                       get_move_names, get_move_table, permutation_parity, sequence_permutation)
+from cube_encoding import get_corners
+from cube_tables import map_table
+
+SIZE = 4
+MOVES = get_move_names(SIZE)
+MOVE_INDEX = {move: i for i, move in enumerate(MOVES)}
+OUTER_MOVES = [format_move(face, clockwise, double, 1) for face in FACES
+               for clockwise, double in ((True, False), (False, False), (True, True))]
+INNER_HALF_TURNS = [format_move(face, True, True, 2) for face in FACES]
+
+# Flips the UF edge pair (one wing swap), centers only move within U
+OLL_PARITY = "2R2 B2 U2 2L U2 2R' U2 2R U2 F2 2R F2 2L' B2 2R2".split()
+# Swaps the UF and UB edge pairs, i.e. r2 U2 r2 Uw2 r2 u2
+PLL_PARITY = "2R2 U2 2R2 U2 2U2 2R2 2U2".split()
+
+UNVISITED = 255
+FINAL_STAGE_SHARE = 0.25  # part of the time budget the 3x3 stage may spend shortening its end of the solution
+
+# Center facelets, four per face in FACES order, so position k sits on face k // 4
+CENTERS = [face * 16 + i * 4 + j for face in range(6) for i in (1, 2) for j in (1, 2)]
+
+#Center stages
+def colex_rank(mask):
+    """Rank a bit set among all sets of the same size, in numeric order of the masks"""
+    rank, k, bit = 0, 0, 0
+    while mask:
+        if mask & 1:
+            k += 1
+            rank += comb(bit, k)
+        mask >>= 1
+        bit += 1
+    return rank
+
+def masks_with_bits(width, count):
+    return [sum(1 << bit for bit in bits) for bits in itertools.combinations(range(width), count)]
+
+def axis_masks():
+    # One color per axis: 4 of the 8 centers on U/D, on R/L and on F/B
+    axis = masks_with_bits(8, 4)
+    return [ud | rl << 8 | fb << 16 for fb in axis for rl in axis for ud in axis]
+
+def axis_rank(mask):
+    return colex_rank(mask >> 16) * 4900 + colex_rank(mask >> 8 & 255) * 70 + colex_rank(mask & 255)
+
+def axis_goals():
+    # The scheme with W, R and B on U, R and F, and its three half-turn rotations
+    goals = []
+    for flips in itertools.product((0, 1), repeat=3):
+        if sum(flips) % 2 == 0:
+            goals.append(sum((0x0F << 4 * flip) << 8 * axis for axis, flip in enumerate(flips)))
+    return goals
+
+CENTER_STAGES = [
+    {   # U/D colors onto U and D, any move
+        'table': 'centers_ud_4x4.bin',
+        'moves': MOVES,
+        'offset': 0, 'bits': 24, 'colors': (0, 1),
+        'states': lambda: masks_with_bits(24, 8),
+        'count': 735471,
+        'rank': colex_rank,
+        'goals': lambda: [0xFF],
+    },
+    {   # R/L colors onto R and L, keeping U/D in place
+        'table': 'centers_rl_4x4.bin',
+        'moves': OUTER_MOVES + [format_move(face, clockwise, double, 2) for face in ('U', 'D')
+                                for clockwise, double in ((True, False), (False, False), (True, True))]
+                 + [format_move(face, True, True, 2) for face in ('R', 'L', 'F', 'B')],
+        'offset': 8, 'bits': 16, 'colors': (2, 3),
+        'states': lambda: masks_with_bits(16, 8),
+        'count': 12870,
+        'rank': colex_rank,
+        'goals': lambda: [0xFF],
+    },
+    {   # Every face uniform, inner slices only turn halfway so axes stay put
+        'table': 'centers_faces_4x4.bin',
+        'moves': OUTER_MOVES + INNER_HALF_TURNS,
+        'offset': 0, 'bits': 24, 'colors': (0, 2, 4),
+        'states': axis_masks,
+        'count': 343000,
+        'rank': axis_rank,
+        'goals': axis_goals,
+    },
+]
+
+stage_moves = {}  # table name -> per move byte lookup tables for the stage mask
+
+def get_stage_moves(stage):
+    """Get per move lookup tables that turn the stage's center mask one byte at a time"""
+    if stage['table'] not in stage_moves:
+        table = get_move_table(SIZE)
+        position = {facelet: k for k, facelet in enumerate(CENTERS)}
+        offset, bits = stage['offset'], stage['bits']
+
+        result = []
+        for move in stage['moves']:
+            perm = table['perms'][move]
+            # Position k gets the center from position sources[k]
+            sources = [position[perm[CENTERS[offset + k]]] - offset for k in range(bits)]
+            byte_tables = []
+            for byte in range(0, bits, 8):
+                lookup = [0] * 256
+                for value in range(256):
+                    for k, source in enumerate(sources):
+                        if byte <= source < byte + 8 and value >> (source - byte) & 1:
+                            lookup[value] |= 1 << k
+                byte_tables.append(lookup)
+            result.append(byte_tables)
+        stage_moves[stage['table']] = result
+    return stage_moves[stage['table']]
+
+def move_mask(mask, byte_tables):
+    """Turn a stage mask with one move's byte lookup tables"""
+    result = 0
+    for byte, lookup in enumerate(byte_tables):
+        result |= lookup[mask >> 8 * byte & 255]
+    return result
+
+def build_stage_table(stage):
+    """Breadth-first search from the stage's goals, one byte of distance per center mask"""
+    import numpy as np
+
+    states = np.array(sorted(stage['states']()), dtype=np.int64)
+    lookups = np.array(get_stage_moves(stage), dtype=np.int64)
+
+    distance = np.full(len(states), UNVISITED, dtype=np.uint8)
+    frontier = np.searchsorted(states, stage['goals']())
+    distance[frontier] = 0
+    depth = 0
+    while len(frontier):
+        masks = states[frontier]
+        for byte_tables in lookups:
+            moved = np.zeros(len(masks), dtype=np.int64)
+            for byte, lookup in enumerate(byte_tables):
+                moved |= lookup[masks >> 8 * byte & 255]
+            index = np.searchsorted(states, moved)
+            distance[index[distance[index] == UNVISITED]] = depth + 1
+        depth += 1
+        frontier = np.flatnonzero(distance == depth)
+    return distance.tobytes()
+
+def get_stage_table(stage):
+    return map_table(stage['table'], stage['count'], lambda: build_stage_table(stage))
+
+def solve_stage(cube, stage):
+    """Walk a center stage's distance table down to zero, turning the cube along the way"""
+    distance = get_stage_table(stage)
+    lookups = get_stage_moves(stage)
+    rank = stage['rank']
+
+    mask = 0
+    for k in range(stage['bits']):
+        if cube.facelets[CENTERS[stage['offset'] + k]] in stage['colors']:
+            mask |= 1 << k
+
+    moves = []
+    remaining = distance[rank(mask)]
+    while remaining:
+        for move, byte_tables in zip(stage['moves'], lookups):
+            moved = move_mask(mask, byte_tables)
+            if distance[rank(moved)] < remaining:
+                break
+        moves.append(move)
+        mask = moved
+        remaining -= 1
+
+    cube.apply_sequence(moves)
+    return moves
+
+#Wings
+def get_wings():
+    """Get every wing slot as (position, ((normal, facelet), (normal, facelet)))"""
+    return [cubelet for cubelet in get_layout(SIZE)['cubelets'] if len(cubelet[1]) == 2]
+
+def handedness(first, second, pos):
+    """Which end of its edge a wing is on, seen with the given sticker order (+1 or -1)"""
+    det = (first[0] * (second[1] * pos[2] - second[2] * pos[1]) -
+           first[1] * (second[0] * pos[2] - second[2] * pos[0]) +
+           first[2] * (second[0] * pos[1] - second[1] * pos[0]))
+    return 1 if det > 0 else -1
+
+def get_wing_homes():
+    """Map (color, color, handedness) of a wing to its home slot"""
+    face_of = {axis: FACES.index(face) for face, axis in FACE_AXES.items()}
+    homes = {}
+    for slot, (pos, ((first, _), (second, _))) in enumerate(get_wings()):
+        hand = handedness(first, second, pos)
+        homes[(face_of[first], face_of[second], hand)] = slot
+        homes[(face_of[second], face_of[first], -hand)] = slot
+    return homes
+
+def get_wing_moves():
+    """For every move, the slot each wing slot's piece ends up in"""
+    table = get_move_table(SIZE)
+    slot_of = {facelet: slot for slot, (_, stickers) in enumerate(get_wings()) for _, facelet in stickers}
+    result = []
+    for move in MOVES:
+        destination = {source: i for i, source in enumerate(table['perms'][move])}
+        result.append([slot_of[destination[stickers[0][1]]] for _, stickers in get_wings()])
+    return result
+
+def cycle_key(cycle):
+    """Rotate a 3-cycle so it starts at its smallest slot"""
+    start = cycle.index(min(cycle))
+    return cycle[start:] + cycle[:start]
+
+def is_pure_wing_cycle(perm, wing_facelets):
+    moved = [i for i, source in enumerate(perm) if source != i]
+    return len(moved) == 6 and all(i in wing_facelets for i in moved)
+
+CYCLE_RECORD = 15  # one length byte, then up to 14 moves (8 + two 3-move setups)
+
+def build_cycle_table():
+    """Find an algorithm for every wing 3-cycle: commutators [x, A B A'] conjugated by setups"""
+    table = get_move_table(SIZE)
+    wing_facelets = {facelet for _, stickers in get_wings() for _, facelet in stickers}
+    wing_moves = get_wing_moves()
+    inner = [move for move in MOVES if move not in OUTER_MOVES]
+
+    def cycle_of(moves):
+        slots = list(range(len(wing_moves[0])))
+        for move in moves:
+            slots = [wing_moves[MOVE_INDEX[move]][slot] for slot in slots]
+        start = next(slot for slot, dest in enumerate(slots) if dest != slot)
+        return cycle_key((start, slots[start], slots[slots[start]]))
+
+    # Base commutators: an inner slice quarter turn against a conjugated outer move
+    base = {}
+    for slice_move in inner:
+        if slice_move.endswith('2'):
+            continue
+        for first in OUTER_MOVES:
+            for second in OUTER_MOVES:
+                if first[0] == second[0]:
+                    continue
+                turn = [first, second, get_inverse_move(first)]
+                moves = [slice_move] + turn + [get_inverse_move(slice_move)] + [get_inverse_move(m) for m in reversed(turn)]
+                if is_pure_wing_cycle(sequence_permutation(moves, table), wing_facelets):
+                    base.setdefault(cycle_of(moves), moves)
+
+    # Setup moves carry every other cycle onto a base one, shortest setups first
+    found = dict(base)
+    missing = {cycle_key(cycle) for cycle in itertools.permutations(range(24), 3)}.difference(found)
+    for length in (1, 2, 3):
+        for setup in itertools.product(MOVES, repeat=length):
+            if not missing:
+                break
+            if any(get_move_base(a) == get_move_base(b) for a, b in zip(setup, setup[1:])):
+                continue
+            slots = list(range(24))
+            for move in setup:
+                slots = [wing_moves[MOVE_INDEX[move]][slot] for slot in slots]
+            undo = [get_inverse_move(move) for move in reversed(setup)]
+
+            # Walk whichever side is smaller: the cycles still missing or the base cycles
+            if len(missing) < len(base):
+                for key in list(missing):
+                    moved = cycle_key(tuple(slots[slot] for slot in key))
+                    if moved in base:
+                        found[key] = list(setup) + base[moved] + undo
+                        missing.discard(key)
+            else:
+                back = {dest: slot for slot, dest in enumerate(slots)}
+                for moved, moves in base.items():
+                    key = cycle_key(tuple(back[slot] for slot in moved))
+                    if key in missing:
+                        found[key] = list(setup) + moves + undo
+                        missing.discard(key)
+
+    data = bytearray(24 * 24 * 24 * CYCLE_RECORD)
+    for (a, b, c), moves in found.items():
+        start = ((a * 24 + b) * 24 + c) * CYCLE_RECORD
+        data[start] = len(moves)
+        data[start + 1:start + 1 + len(moves)] = bytes(MOVE_INDEX[move] for move in moves)
+    return bytes(data)
+
+def get_cycle_table():
+    return map_table('wing_cycles_4x4.bin', 24 * 24 * 24 * CYCLE_RECORD, build_cycle_table)
+
+def get_cycle(cycles, cycle):
+    """Look up the moves that send the piece in slot a to b, b to c and c to a"""
+    a, b, c = cycle_key(cycle)
+    start = ((a * 24 + b) * 24 + c) * CYCLE_RECORD
+    return [MOVES[index] for index in cycles[start + 1:start + 1 + cycles[start]]]
+
+def get_center_frame(cube):
+    """Get the color renaming (translate table) that names every color after its center's face"""
+    rename = list(range(256))
+    for face in range(6):
+        rename[cube.facelets[CENTERS[face * 4]]] = face
+    return bytes(rename)
+
+def get_wing_pieces(cube):
+    """Get the home slot of the wing in every slot"""
+    facelets = bytes(cube.facelets).translate(get_center_frame(cube))
+    homes = get_wing_homes()
+    return [homes[(facelets[first[1]], facelets[second[1]], handedness(first[0], second[0], pos))]
+            for pos, (first, second) in get_wings()]
+
+def solve_wings(cube):
+    """Put every wing in its home slot with 3-cycles, fixing odd wing parity first"""
+    moves = []
+    if permutation_parity(get_wing_pieces(cube)):
+        cube.apply_sequence(OLL_PARITY)
+        moves += OLL_PARITY
+
+    cycles = get_cycle_table()
+    pieces = get_wing_pieces(cube)
+    while True:
+        wrong = [slot for slot, home in enumerate(pieces) if home != slot]
+        if not wrong:
+            break
+
+        # Send the first misplaced wing home, and the one it displaces too when possible
+        first = wrong[0]
+        second = pieces[first]
+        third = pieces[second]
+        if third == first:
+            third = next(slot for slot in wrong if slot not in (first, second))
+
+        algorithm = get_cycle(cycles, (first, second, third))
+        cube.apply_sequence(algorithm)
+        moves += algorithm
+        pieces[first], pieces[second], pieces[third] = pieces[third], pieces[first], pieces[second]
+    return moves
+
+#Reduction
+def reduce_to_3x3(cube):
+    """Get the 3x3 that a 4x4 with solved centers and paired edges stands for"""
+    rows = (0, 1, 3)
+    small = FaceletCube(3)
+    small.load_facelets(cube.facelets[face * 16 + i * 4 + j] for face in range(6) for i in rows for j in rows)
+    return small
+
+def solve(cube, time_budget=solver_3x3.SOLVE_TIME_BUDGET, on_solution=None, stop=None):
+    """Get a solution (list of moves) for a 4x4 cube, reduction takes milliseconds and the 3x3 stage the rest
+
+    on_solution, if given, is called with every shorter solution as the 3x3 stage finds it.
+    stop is passed on to the 3x3 stage, None comes back if it is set before a solution is found.
+    """
+    work = FaceletCube(SIZE)
+    work.load_facelets(cube.facelets)
+
+    moves = []
+    for stage in CENTER_STAGES:
+        moves += solve_stage(work, stage)
+    moves += solve_wings(work)
+
+    # An odd corner permutation next to solved edges cannot be solved with outer moves
+    cp, _ = get_corners(bytes(work.facelets).translate(get_center_frame(work)), SIZE)
+    if permutation_parity(cp):
+        work.apply_sequence(PLL_PARITY)
+        moves += PLL_PARITY
+
+    report = None if on_solution is None else lambda tail: on_solution(moves + tail)
+    tail = solver_3x3.solve(reduce_to_3x3(work), time_budget * FINAL_STAGE_SHARE, report, stop=stop)
+    return None if tail is None else moves + tail
+
+def build_tables():
+    """Build every table that is still missing"""
+    for stage in CENTER_STAGES:
+        get_stage_table(stage)
+    get_cycle_table()
+    solver_3x3.build_tables()
+
+def main():
+    """Build the tables, or solve a scramble given on the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="4x4 reduction solver")
+    parser.add_argument('--build', action='store_true', help="build the lookup tables and exit")
+    parser.add_argument('--time', type=float, default=solver_3x3.SOLVE_TIME_BUDGET,
+                        help="time budget in seconds")
+    parser.add_argument('scramble', nargs='*', help="scramble moves, e.g. R 2U F' 2R2")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build_tables()
+    print(f"Tables ready in {time.perf_counter() - start:.2f}s")
+    if args.build:
+        return
+
+    cube = FaceletCube(SIZE)
+    cube.apply_sequence(args.scramble)
+    start = time.perf_counter()
+    solution = solve(cube, args.time)
+    print(f"Solution ({len(solution)} moves, {time.perf_counter() - start:.2f}s): {' '.join(solution)}")
+
+if __name__ == "__main__":
+    main()
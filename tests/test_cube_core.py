@@ -0,0 +1,44 @@
+"""Tests for the move engine helpers in cube_core"""
+import random
+
+import pytest
+
+from cube_core import FaceletCube, generate_scramble, simplify_moves
+
+def apply(size, moves):
+    """Get the cube a move sequence leads to from solved"""
+    cube = FaceletCube(size)
+    cube.apply_sequence(moves)
+    return cube
+
+@pytest.mark.parametrize('moves, expected', [
+    (['R', 'R'], ['R2']),
+    (['R', "R'"], []),
+    (['R2', 'R2'], []),
+    (['R', 'L', 'R'], ['R2', 'L']),
+    (['U', 'D', "U'"], ['D']),
+    (['R', 'U', 'R'], ['R', 'U', 'R']),
+])
+def test_simplify_merges_same_axis(moves, expected):
+    assert simplify_moves(moves, 3) == expected
+
+def test_simplify_keeps_slice_face():
+    assert simplify_moves(['2D'], 4) == ['2D']
+    assert simplify_moves(['2U', '2D'], 5) == ['2U', '2D']
+
+@pytest.mark.parametrize('size', range(2, 8))
+def test_simplify_keeps_state(size):
+    rng = random.Random(size)
+    for _ in range(20):
+        moves = generate_scramble(size, 30, rng)
+        # Repeat some moves so there is something to merge
+        moves = [move for move in moves for _ in range(rng.randint(1, 3))]
+        simplified = simplify_moves(moves, size)
+        assert apply(size, simplified).facelets == apply(size, moves).facelets
+        assert len(simplified) <= len(moves)
+        assert simplify_moves(simplified, size) == simplified
+
+def test_incremental_state_matches_full():
+    cube = apply(4, generate_scramble(4, 40, random.Random(1)))
+    assert cube.hash == cube.full_hash()
+    assert not cube.is_solved()
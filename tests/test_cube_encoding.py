@@ -0,0 +1,48 @@
+"""Round trips for the coordinates and state encodings in cube_encoding"""
+import random
+from math import factorial
+
+import pytest
+
+from cube_core import FaceletCube, generate_scramble
+from cube_encoding import (canonical_facelets, decode_2x2, decode_3x3, decode_state, encode_2x2, encode_3x3,
+                           encode_state, orientation_rank, orientation_unrank, permutation_rank, permutation_unrank)
+
+def scrambled(size, seed):
+    """Get a cube scrambled with 30 random moves"""
+    cube = FaceletCube(size)
+    cube.apply_sequence(generate_scramble(size, 30, random.Random(seed)))
+    return cube
+
+def test_permutation_rank_round_trip():
+    rng = random.Random(0)
+    for n in (4, 8, 12):
+        for _ in range(50):
+            rank = rng.randrange(factorial(n))
+            assert permutation_rank(permutation_unrank(rank, n)) == rank
+
+def test_orientation_rank_round_trip():
+    for base, n in ((3, 8), (2, 12)):
+        for rank in range(0, base ** (n - 1), 97):
+            orientation = orientation_unrank(rank, base, n)
+            assert sum(orientation) % base == 0
+            assert orientation_rank(orientation, base) == rank
+
+@pytest.mark.parametrize('seed', range(10))
+def test_2x2_round_trip(seed):
+    cube = scrambled(2, seed)
+    decoded = decode_2x2(encode_2x2(cube))
+    assert decoded.facelets == canonical_facelets(cube)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_3x3_round_trip(seed):
+    cube = scrambled(3, seed)
+    decoded = decode_3x3(encode_3x3(cube))
+    assert decoded.facelets == canonical_facelets(cube)
+
+@pytest.mark.parametrize('size', [2, 3, 4, 5])
+def test_state_round_trip(size):
+    cube = scrambled(size, size)
+    decoded = decode_state(size, encode_state(cube))
+    assert encode_state(decoded) == encode_state(cube)
+    assert decoded.hash == decoded.full_hash()
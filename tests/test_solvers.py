@@ -0,0 +1,45 @@
+"""Scramble, solve and check the result for every size with a solver"""
+import random
+
+import pytest
+
+import solver_2x2
+import solver_3x3
+import solver_4x4
+from cube_core import FaceletCube, generate_scramble
+
+def scrambled(size, seed):
+    """Get a cube scrambled with 40 random moves"""
+    cube = FaceletCube(size)
+    cube.apply_sequence(generate_scramble(size, 40, random.Random(seed)))
+    return cube
+
+def solved_by(cube, moves):
+    """Check if the moves solve a copy of the cube"""
+    copy = FaceletCube(cube.size)
+    copy.load_facelets(cube.facelets)
+    copy.apply_sequence(moves)
+    return copy.is_solved()
+
+@pytest.mark.parametrize('seed', range(5))
+def test_2x2(seed):
+    cube = scrambled(2, seed)
+    moves = solver_2x2.solve(cube)
+    assert solved_by(cube, moves)
+    assert len(moves) <= 11
+
+@pytest.mark.parametrize('seed', range(5))
+def test_3x3(seed):
+    cube = scrambled(3, seed)
+    moves = solver_3x3.solve(cube, 0.2)
+    assert solved_by(cube, moves)
+    assert len(moves) <= 30
+
+@pytest.mark.parametrize('seed', range(3))
+def test_4x4(seed):
+    cube = scrambled(4, seed)
+    assert solved_by(cube, solver_4x4.solve(cube, 0.2))
+
+def test_solved_cube():
+    for solver, size in ((solver_2x2, 2), (solver_3x3, 3), (solver_4x4, 4)):
+        assert solved_by(FaceletCube(size), solver.solve(FaceletCube(size)))